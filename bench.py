@@ -0,0 +1,598 @@
+"""
+Linux.Do 脚本离线基准测试
+
+在本地启动一个 Discourse 替身服务（登录页、/latest、话题页、点赞/回复接口、/session、
+/session/csrf 以及 connect 升级要求表，页面带图片、字体和第三方脚本），把 main.py 的站点地址指向它，
+按引擎、并发度、是否拦截资源和是否复用标签页逐组运行，统计端到端耗时、点赞/回复数、话题耗时分位数、CDP 往返次数和峰值内存。
+
+结果追加到 bench_results.jsonl（带 git 提交号），并与其他提交上相同配置的最近一次结果对比。
+
+也可以回放真实站点上录制的录像（CASSETTE_MODE=record 运行 main.py 得到），按原始或缩放后的延迟
+在不同提交上重复同一次运行，比较耗时和请求数。
+
+用法:
+    python bench.py --engines http,browser --concurrency 1,3 --topics 8 --latency-ms 30
+    python bench.py --engines browser --blocking false,true
+    python bench.py --engines browser --tab-pool false,true
+    python bench.py --cassette linuxdo_cassette.jsonl --latency-scale 1,0
+"""
+import os
+import re
+import html
+import sys
+import json
+import time
+import uuid
+import argparse
+import itertools
+import tempfile
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from http.cookies import SimpleCookie
+from urllib.parse import urlparse, parse_qs
+from tabulate import tabulate
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+RESULTS_FILE = os.path.join(ROOT, "bench_results.jsonl")
+REGRESSION_THRESHOLD = 0.2  # 相对上一次结果变慢超过 20% 视为退化
+# 测量方式变化时递增，旧结果不再参与对比（2：PACING_SCALE=0 时令牌桶不再限速，之前的结果主要是调度器等待）
+BENCH_VERSION = 2
+
+BENCH_USERNAME = "bench"
+BENCH_PASSWORD = "bench-password"
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style>
+@font-face {{ font-family: BenchSans; src: url(/fonts/bench-sans.woff2) format("woff2"); }}
+body {{ font-family: BenchSans, sans-serif; }}
+</style>
+<script async src="{third_party}/googletagmanager.com/gtag/js"></script>
+<script defer src="{third_party}/cloudflareinsights.com/beacon.min.js"></script>
+</head>
+<body>
+<header>{user}</header>
+<div id="data-preloaded" data-preloaded="{preloaded}"></div>
+<div id="main-outlet">{body}</div>
+</body></html>"""
+
+LOGIN_BODY = """
+<div id="login-form">
+  <input id="login-account-name" type="text">
+  <input id="login-account-password" type="password">
+  <button id="login-button">登录</button>
+</div>
+<script>
+document.getElementById('login-button').addEventListener('click', async () => {
+  const body = new URLSearchParams({
+    login: document.getElementById('login-account-name').value,
+    password: document.getElementById('login-account-password').value,
+  });
+  const resp = await fetch('/session', {method: 'POST', body});
+  const data = await resp.json();
+  if (!data.error) location.href = '/';
+});
+</script>
+"""
+
+# 页面引用的图片、字体和第三方脚本：路径 -> (Content-Type, 字节数)，用于衡量请求拦截的效果
+ASSETS = (
+    (re.compile(r"/uploads/\d+\.png"), "image/png", 48 * 1024),
+    (re.compile(r"/user_avatar/\d+\.png"), "image/png", 4 * 1024),
+    (re.compile(r"/fonts/[\w-]+\.woff2"), "font/woff2", 96 * 1024),
+    (re.compile(r"/(?:googletagmanager|cloudflareinsights)\.com/.+"), "application/javascript", 64 * 1024),
+)
+
+TOPIC_SCRIPT = """
+<script>
+// 帖子由前端根据话题 JSON 渲染：整页加载时取自 #data-preloaded，路由跳转时取自 /t/{id}.json
+function renderTopic(topic) {
+  const container = document.getElementById('topic');
+  container.dataset.topicId = topic.id;
+  container.innerHTML = topic.post_stream.posts.map(p =>
+    `<article id="post_${p.post_number}" class="topic-post" style="min-height:600px">` +
+    `<img class="avatar" src="/user_avatar/${p.post_number % 7}.png" width="48" height="48">${p.cooked}` +
+    `<div class="actions"><button class="widget-button btn-flat like" data-post-id="${p.id}" title="点赞">♥</button>` +
+    `</div></article>`
+  ).join('');
+  document.title = topic.title;
+  document.getElementById('reply-control').style.display = 'none';
+}
+const preloaded = JSON.parse(document.getElementById('data-preloaded').dataset.preloaded);
+renderTopic(JSON.parse(preloaded[`topic_${document.getElementById('topic').dataset.topicId}`]));
+
+// Discourse 前端路由的最小替身：改写地址后通过 XHR 取话题 JSON 重新渲染
+window.DiscourseURL = {
+  routeTo(url) {
+    const match = url.match(/\/t\/[^/]+\/(\d+)/);
+    if (!match) {
+      location.href = url;
+      return;
+    }
+    history.pushState({}, '', url);
+    window.scrollTo(0, 0);
+    fetch(`/t/${match[1]}.json`).then(resp => resp.json()).then(renderTopic);
+  },
+};
+
+document.addEventListener('click', async event => {
+  const like = event.target.closest('.like');
+  if (like) {
+    await fetch(`/discourse-reactions/posts/${like.dataset.postId}/custom-reactions/heart/toggle.json`, {method: 'PUT'});
+    like.classList.add('has-reaction');
+  } else if (event.target.closest('#topic-footer-buttons .reply')) {
+    document.getElementById('reply-control').style.display = 'block';
+  } else if (event.target.closest('#reply-control button.create')) {
+    const topicId = document.getElementById('topic').dataset.topicId;
+    const body = new URLSearchParams({topic_id: topicId, raw: document.querySelector('.d-editor-input').value});
+    await fetch('/posts.json', {method: 'POST', body});
+    document.getElementById('reply-control').style.display = 'none';
+  }
+});
+</script>
+"""
+
+
+class StandInDiscourse:
+    """本地 Discourse 替身：只实现 main.py 用到的页面和接口，支持注入固定延迟"""
+
+    def __init__(self, topics: int = 60, posts_per_topic: int = 20, latency_ms: int = 0, requirements=None) -> None:
+        self.topics = topics
+        self.posts_per_topic = posts_per_topic
+        self.latency = latency_ms / 1000
+        # connect 升级要求表: 项目 -> (当前, 要求)
+        self.requirements = requirements or {}
+        self.sessions = set()
+        self.lock = threading.Lock()
+        self.hits = {}
+        self.server = None
+        # 第三方脚本挂在另一个主机名下（同一个服务），与站点不同源
+        self.third_party = ""
+
+    def start(self):
+        """在随机端口启动服务，返回站点地址"""
+        app = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                app.handle(self, "GET")
+
+            def do_POST(self):
+                app.handle(self, "POST")
+
+            def do_PUT(self):
+                app.handle(self, "PUT")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.third_party = f"http://localhost:{self.server.server_address[1]}"
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def reset_hits(self):
+        with self.lock:
+            hits, self.hits = self.hits, {}
+        return hits
+
+    # ---------- 数据 ----------
+
+    def topic_list(self):
+        return {
+            "topic_list": {
+                "topics": [
+                    {
+                        "id": topic_id,
+                        "title": f"基准测试话题 {topic_id}",
+                        "slug": f"bench-topic-{topic_id}",
+                        "posts_count": self.posts_per_topic,
+                        "highest_post_number": self.posts_per_topic,
+                        "pinned": False,
+                    }
+                    for topic_id in range(1, self.topics + 1)
+                ]
+            }
+        }
+
+    def posts(self, topic_id):
+        return [
+            {
+                "id": topic_id * 1000 + number,
+                "post_number": number,
+                "cooked": f"<p>{'这是用于基准测试的帖子内容。' * (number % 5 + 1)}</p>" + (
+                    f'<img src="/uploads/{topic_id * 1000 + number}.png" width="690" height="388" loading="lazy">'
+                    if number % 2 else ""
+                ),
+                "yours": False,
+                "actions_summary": [{"id": 2, "can_act": True}],
+            }
+            for number in range(1, self.posts_per_topic + 1)
+        ]
+
+    # ---------- 页面 ----------
+
+    def page(self, title, body, logged_in, preloaded=None):
+        user = '<div id="current-user"><img class="avatar" src="/user_avatar/1.png"></div>' if logged_in else (
+            '<button class="login-button">登录</button>'
+        )
+        # 与 Discourse 一样把首屏数据以 JSON 字符串的形式预加载在 #data-preloaded 上
+        store = {key: json.dumps(value, ensure_ascii=False) for key, value in (preloaded or {}).items()}
+        if logged_in:
+            store["currentUser"] = json.dumps({"id": 1, "username": BENCH_USERNAME})
+        return PAGE_TEMPLATE.format(
+            title=title, third_party=self.third_party, user=user, body=body, preloaded=html.escape(json.dumps(store, ensure_ascii=False))
+        )
+
+    def latest_page(self, logged_in):
+        rows = "".join(
+            f'<tr class="topic-list-item"><td><a class="title" href="/t/{t["slug"]}/{t["id"]}">{t["title"]}</a></td></tr>'
+            for t in self.topic_list()["topic_list"]["topics"]
+        )
+        return self.page(
+            "最新话题", f'<div id="list-area"><table>{rows}</table></div>', logged_in, {"topic_list": self.topic_list()}
+        )
+
+    def topic(self, topic_id):
+        meta = next((t for t in self.topic_list()["topic_list"]["topics"] if t["id"] == topic_id), {"id": topic_id})
+        return {**meta, "post_stream": {"posts": self.posts(topic_id)}}
+
+    def topic_page(self, topic_id, logged_in):
+        footer = (
+            '<div id="topic-footer-buttons"><button class="btn reply">回复</button></div>'
+            '<div id="reply-control" style="display:none">'
+            '<textarea class="d-editor-input"></textarea><button class="btn create">回复</button></div>'
+        )
+        body = f'<div id="topic" data-topic-id="{topic_id}"></div>' + footer + TOPIC_SCRIPT
+        return self.page(f"基准测试话题 {topic_id}", body, logged_in, {f"topic_{topic_id}": self.topic(topic_id)})
+
+    def connect_page(self):
+        rows = "".join(
+            f"<tr><td>{project}</td><td>{current}</td><td>{required}</td></tr>"
+            for project, (current, required) in self.requirements.items()
+        )
+        return f"<html><body><table><tr><th>项目</th><th>当前</th><th>要求</th></tr>{rows}</table></body></html>"
+
+    # ---------- 路由 ----------
+
+    def handle(self, request, method):
+        if self.latency:
+            time.sleep(self.latency)
+        path = urlparse(request.path).path
+        length = int(request.headers.get("Content-Length") or 0)
+        body = request.rfile.read(length).decode("utf-8", "replace") if length else ""
+        cookies = SimpleCookie(request.headers.get("Cookie", ""))
+        logged_in = "_t" in cookies and cookies["_t"].value in self.sessions
+        with self.lock:
+            key = f"{method} {re.sub(r'[0-9]+', ':id', path)}"
+            self.hits[key] = self.hits.get(key, 0) + 1
+
+        for pattern, content_type, size in ASSETS:
+            if method == "GET" and pattern.fullmatch(path):
+                return self.send(
+                    request, 200, asset_body(content_type, size), content_type,
+                    {"Cache-Control": "public, max-age=31536000, immutable"},
+                )
+        if method == "GET" and path in ("/", "/latest"):
+            return self.send(request, 200, self.latest_page(logged_in), "text/html")
+        if method == "GET" and path == "/login":
+            return self.send(request, 200, self.page("登录", LOGIN_BODY, logged_in), "text/html")
+        if method == "GET" and path.startswith("/connect"):
+            return self.send(request, 200, self.connect_page(), "text/html")
+        if method == "GET" and path == "/session/csrf":
+            return self.send_json(request, {"csrf": uuid.uuid4().hex})
+        if method == "GET" and path == "/session/current.json":
+            if not logged_in:
+                return self.send_json(request, {"error": "not logged in"}, 404)
+            return self.send_json(request, {"current_user": {"id": 1, "username": BENCH_USERNAME}})
+        if method == "GET" and path in ("/latest.json", "/unread.json", "/new.json"):
+            return self.send_json(request, self.topic_list())
+        match = re.fullmatch(r"/t/(\d+)\.json", path)
+        if method == "GET" and match:
+            return self.send_json(request, self.topic(int(match.group(1))))
+        match = re.fullmatch(r"/t/[^/]+/(\d+)(?:/\d+)?", path)
+        if method == "GET" and match:
+            return self.send(request, 200, self.topic_page(int(match.group(1)), logged_in), "text/html")
+
+        if method == "POST" and path == "/session":
+            form = parse_qs(body)
+            if form.get("login", [""])[0] != BENCH_USERNAME or form.get("password", [""])[0] != BENCH_PASSWORD:
+                return self.send_json(request, {"error": "用户名或密码错误"})
+            token = uuid.uuid4().hex
+            self.sessions.add(token)
+            return self.send_json(
+                request, {"user": {"id": 1, "username": BENCH_USERNAME}},
+                headers={"Set-Cookie": f"_t={token}; Path=/; HttpOnly"},
+            )
+        if not logged_in:
+            return self.send_json(request, {"errors": ["not logged in"]}, 403)
+        if method == "POST" and path in ("/topics/timings", "/post_actions"):
+            return self.send_json(request, {})
+        if method == "POST" and path == "/posts.json":
+            return self.send_json(request, {"id": int(time.time() * 1000)})
+        if method == "PUT" and path.startswith("/discourse-reactions/posts/"):
+            return self.send_json(request, {})
+        return self.send(request, 404, "not found", "text/plain")
+
+    def send_json(self, request, data, status=200, headers=None):
+        return self.send(request, status, json.dumps(data, ensure_ascii=False), "application/json", headers)
+
+    def send(self, request, status, text, content_type, headers=None):
+        if isinstance(text, bytes):
+            payload = text
+        else:
+            payload = text.encode("utf-8")
+            content_type = f"{content_type}; charset=utf-8"
+        request.send_response(status)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(payload)
+
+
+def asset_body(content_type, size):
+    """指定大小的占位资源（只用于产生流量，内容不必能解码）"""
+    if content_type == "application/javascript":
+        return b"/*" + b" " * (size - 4) + b"*/"
+    if content_type == "image/png":
+        return b"\x89PNG\r\n\x1a\n" + bytes(size - 8)
+    return bytes(size)
+
+
+def git_commit():
+    """当前提交号，工作区有改动时加 -dirty"""
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+        dirty = subprocess.call(["git", "diff", "--quiet", "HEAD", "--", "main.py"], cwd=ROOT) != 0
+        return f"{commit}-dirty" if dirty else commit
+    except Exception:
+        return "unknown"
+
+
+def run_once(base_url, engine, concurrency, args, extra_env=None, files=None):
+    """在独立的数据目录中运行一次 main.py，返回结果（files 为预先写入数据目录的文件）"""
+    with tempfile.TemporaryDirectory(prefix="linuxdo_bench_") as data_dir:
+        for name, content in (files or {}).items():
+            with open(os.path.join(data_dir, name), 'w', encoding='utf-8') as f:
+                f.write(content)
+        env = {
+            key: value for key, value in os.environ.items()
+            if not key.startswith(("GOTIFY_", "SC3_", "TG_", "WECHAT_", "LINUXDO_", "BROWSER_PROFILE"))
+        }
+        env.update({
+            "LINUXDO_USERNAME": BENCH_USERNAME,
+            "LINUXDO_PASSWORD": BENCH_PASSWORD,
+            "LINUXDO_BASE_URL": base_url,
+            "LINUXDO_CONNECT_URL": f"{base_url}/connect/",
+            "LINUXDO_DATA_DIR": data_dir,
+            "BROWSE_ENGINE": engine,
+            "BROWSE_CONCURRENCY": str(concurrency),
+            "PACING_SCALE": str(args.pacing_scale),
+            # 每日额度按时间分摊，会让结果随运行时刻变化
+            "JOURNAL_ENABLED": "false",
+            "NO_PROXY": "127.0.0.1,localhost",
+        })
+        env.update(extra_env or {})
+        start = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "main.py")], env=env, cwd=data_dir,
+            stdout=subprocess.DEVNULL if not args.verbose else None, stderr=subprocess.STDOUT,
+        )
+        # wait4 能拿到子进程自身的资源占用（Linux 下 ru_maxrss 单位为 KB）
+        _, status, usage = os.wait4(proc.pid, 0)
+        elapsed = time.perf_counter() - start
+        proc.returncode = os.waitstatus_to_exitcode(status) if hasattr(os, "waitstatus_to_exitcode") else status >> 8
+
+        metrics = {}
+        metrics_file = os.path.join(data_dir, f"linuxdo_metrics_{BENCH_USERNAME}.json")
+        if os.path.exists(metrics_file):
+            with open(metrics_file, 'r', encoding='utf-8') as f:
+                metrics = json.load(f)
+
+    topic_span = metrics.get("spans", {}).get("browse_one_topic", {})
+    return {
+        "exit_code": proc.returncode,
+        "run_seconds": round(elapsed, 3),
+        "topics": topic_span.get("count", 0),
+        "topic_p50_seconds": topic_span.get("p50_seconds", 0),
+        "topic_p90_seconds": topic_span.get("p90_seconds", 0),
+        "cdp_calls": metrics.get("counters", {}).get("cdp_calls", 0),
+        "cdp_kb": round(metrics.get("counters", {}).get("cdp_bytes", 0) / 1024, 1),
+        "http_requests": metrics.get("counters", {}).get("http_requests", 0),
+        "blocked_requests": sum(metrics.get("blocked", {}).values()),
+        "tab_pool": metrics.get("tab_pool", {}),
+        "browser_peak_rss_mb": round(metrics.get("peak_rss_bytes", 0) / 1024 / 1024, 1),
+        "script_peak_rss_mb": round(usage.ru_maxrss / 1024, 1),
+        "stats": metrics.get("stats", {}),
+    }
+
+
+def load_results():
+    if not os.path.exists(RESULTS_FILE):
+        return []
+    with open(RESULTS_FILE, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def previous_result(history, config, commit):
+    """同一配置在其他提交上的最近一次结果"""
+    for record in reversed(history):
+        if record["config"] == config and record["commit"] != commit:
+            return record
+    return None
+
+
+def collect(config, result, commit, history, args):
+    """记录一次结果并与其他提交上相同配置的最近一次结果对比，返回表格行"""
+    previous = previous_result(history, config, commit)
+    delta = ""
+    if previous and previous["result"]["exit_code"] == 0 and result["exit_code"] == 0:
+        before = previous["result"]["run_seconds"]
+        change = (result["run_seconds"] - before) / before if before else 0
+        delta = f"{change:+.0%} vs {previous['commit']}"
+        if change > REGRESSION_THRESHOLD:
+            delta += " ⚠️ 退化"
+
+    record = {"commit": commit, "timestamp": int(time.time()), "config": config, "result": result}
+    history.append(record)
+    if not args.no_save:
+        with open(RESULTS_FILE, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    stats = result.get("stats", {})
+    pool = result.get("tab_pool") or {}
+    return [
+        config["engine"], config["concurrency"], "开" if config.get("blocking") else "关",
+        f"{pool.get('routed', 0)}/{pool.get('reloaded', 0)}" if config.get("tab_pool") else "关",
+        result["exit_code"], result["run_seconds"], result["topics"],
+        stats.get("likes_given", 0), stats.get("replies_posted", 0),
+        result["topic_p50_seconds"], result["topic_p90_seconds"], result["cdp_calls"],
+        result["cdp_kb"], result["http_requests"], result.get("blocked_requests", 0),
+        result["browser_peak_rss_mb"], result["script_peak_rss_mb"], delta,
+    ]
+
+
+def replay(args, commit, history):
+    """回放录像：站点地址、引擎和并发度取自录像元数据，Cookie 文件还原到临时数据目录"""
+    with open(args.cassette, 'r', encoding='utf-8') as f:
+        meta = json.loads(f.readline())
+    rows = []
+    for scale in [float(s) for s in args.latency_scale.split(",")]:
+        config = {
+            "bench_version": BENCH_VERSION,
+            "cassette": os.path.basename(args.cassette),
+            "engine": meta["engine"],
+            "concurrency": meta["concurrency"],
+            "latency_scale": scale,
+            "pacing_scale": args.pacing_scale,
+        }
+        extra_env = {
+            "LINUXDO_CONNECT_URL": meta["connect_url"],
+            "CASSETTE_MODE": "replay",
+            "LINUXDO_CASSETTE": os.path.abspath(args.cassette),
+            "CASSETTE_LATENCY_SCALE": str(scale),
+        }
+        for _ in range(args.repeat):
+            result = run_once(meta["base_url"], meta["engine"], meta["concurrency"], args, extra_env, meta["files"])
+            rows.append(collect(config, result, commit, history, args))
+    return rows
+
+
+def concurrency_speedups(runs):
+    """每次运行相对本轮中并发度为 1、其余配置相同的运行的加速比，没有可比的运行时为空"""
+
+    def baseline_key(config):
+        return json.dumps({k: v for k, v in config.items() if k != "concurrency"}, sort_keys=True)
+
+    baselines = {}
+    for config, result in runs:
+        if config["concurrency"] == 1 and result["exit_code"] == 0:
+            baselines.setdefault(baseline_key(config), result["run_seconds"])
+    speedups = []
+    for config, result in runs:
+        baseline = baselines.get(baseline_key(config))
+        if config["concurrency"] == 1 or not baseline or result["exit_code"] != 0 or not result["run_seconds"]:
+            speedups.append("")
+        else:
+            speedups.append(f"{baseline / result['run_seconds']:.2f}x")
+    return speedups
+
+
+def parse_flags(value):
+    """解析逗号分隔的开关列表（如 false,true）"""
+    return [flag.strip().lower() in ("true", "1", "on") for flag in value.split(",") if flag.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Linux.Do 脚本离线基准测试")
+    parser.add_argument("--engines", default="http,browser", help="逗号分隔: http,browser")
+    parser.add_argument("--concurrency", default="1", help="浏览器引擎的并发度，逗号分隔")
+    parser.add_argument("--blocking", default="false", help="浏览器引擎是否拦截图片/字体/第三方脚本，逗号分隔: false,true")
+    parser.add_argument("--tab-pool", default="false", help="浏览器引擎是否复用话题标签页（前端路由），逗号分隔: false,true")
+    parser.add_argument("--topics", type=int, default=8, help="每次运行浏览的话题数（通过升级要求差距控制）")
+    parser.add_argument("--posts-per-topic", type=int, default=20)
+    parser.add_argument("--latency-ms", type=int, default=30, help="替身服务对每个请求注入的延迟")
+    parser.add_argument("--pacing-scale", type=float, default=0, help="拟人延迟缩放，默认关闭以只测量脚本本身")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--no-save", action="store_true", help="不写入 bench_results.jsonl")
+    parser.add_argument("--verbose", action="store_true", help="显示 main.py 的日志")
+    parser.add_argument("--cassette", help="回放 CASSETTE_MODE=record 录制的录像，不启动替身服务")
+    parser.add_argument("--latency-scale", default="1", help="回放延迟系数，逗号分隔（0 表示不等待）")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    history = load_results()
+    if args.cassette:
+        rows = [row + [""] for row in replay(args, commit, history)]
+        print_rows(commit, rows)
+        return 0 if all(row[4] == 0 for row in rows) else 1
+
+    requirements = {
+        "访问次数": ("10", "50"),
+        "浏览的话题": ("0", str(args.topics)),
+        "已读帖子": ("0", "0"),
+        "点赞": ("0", "3"),
+        "回复的话题": ("0", "1"),
+    }
+    server = StandInDiscourse(args.topics * 4, args.posts_per_topic, args.latency_ms, requirements)
+    base_url = server.start()
+    print(f"替身服务: {base_url}")
+
+    rows, runs = [], []
+    try:
+        for engine in [e.strip() for e in args.engines.split(",") if e.strip()]:
+            browser = engine == "browser"
+            levels = [int(c) for c in args.concurrency.split(",")] if browser else [1]
+            blocking_levels = parse_flags(args.blocking) if browser else [False]
+            pool_levels = parse_flags(args.tab_pool) if browser else [False]
+            for concurrency, blocking, tab_pool in itertools.product(levels, blocking_levels, pool_levels):
+                config = {
+                    "bench_version": BENCH_VERSION,
+                    "engine": engine,
+                    "concurrency": concurrency,
+                    "blocking": blocking,
+                    "tab_pool": tab_pool,
+                    "topics": args.topics,
+                    "posts_per_topic": args.posts_per_topic,
+                    "latency_ms": args.latency_ms,
+                    "pacing_scale": args.pacing_scale,
+                }
+                for _ in range(args.repeat):
+                    server.reset_hits()
+                    extra_env = {"BLOCKING_ENABLED": str(blocking).lower(), "TAB_POOL_ENABLED": str(tab_pool).lower()}
+                    result = run_once(base_url, engine, concurrency, args, extra_env)
+                    result["server_hits"] = server.reset_hits()
+                    rows.append(collect(config, result, commit, history, args))
+                    runs.append((config, result))
+    finally:
+        server.stop()
+
+    for row, speedup in zip(rows, concurrency_speedups(runs)):
+        row.append(speedup)
+
+    print_rows(commit, rows)
+    return 0 if all(row[4] == 0 for row in rows) else 1
+
+
+def print_rows(commit, rows):
+    print(f"提交: {commit}")
+    print(tabulate(
+        rows,
+        headers=["引擎", "并发", "拦截", "标签池(路由/整页)", "退出码", "总耗时(s)", "话题", "点赞", "回复", "p50(s)", "p90(s)", "CDP",
+                 "CDP(KB)", "HTTP", "已拦截", "浏览器峰值(MB)", "脚本峰值(MB)", "对比", "并发加速"],
+        tablefmt="pretty",
+    ))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
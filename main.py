@@ -7,15 +7,20 @@ import os
 import random
 import time
 import functools
+import contextlib
+import contextvars
+import asyncio
+import threading
 import sys
 import re
+import math
 from loguru import logger
-from DrissionPage import ChromiumOptions, Chromium
-from tabulate import tabulate
-from curl_cffi import requests
-from bs4 import BeautifulSoup
+from urllib.parse import urlparse
 import json
 
+# DrissionPage、curl_cffi、bs4、tabulate、psutil 在用到时才导入，
+# 让 check-session / connect-info 等轻量子命令快速启动且不启动 Chromium
+
 
 # ================== 升级配置 ==================
 UPGRADE_CONFIG = {
@@ -24,6 +29,34 @@ UPGRADE_CONFIG = {
     "replies_to_post": 2,          # 每次回复数（谨慎设置）
 }
 
+# 每日总预算：跨多次运行累计（由动作日志统计），每次运行分摊当天剩余额度，单次仍不超过 UPGRADE_CONFIG
+# 默认与单次配置相同，即一天的总量与原先每天运行一次时一致；一天多次运行时按需调大
+DAILY_BUDGET = dict(UPGRADE_CONFIG)
+
+# connect.linux.do 升级要求表中的项目 -> 统计项；同一统计项对应多行时取差距最大的一行
+CONNECT_REQUIREMENTS = {
+    "访问次数": "days_visited",
+    "回复的话题": "replies_posted",
+    "浏览的话题": "topics_browsed",
+    "浏览的话题（所有时间）": "topics_browsed",
+    "已读帖子": "posts_read",
+    "已读帖子（所有时间）": "posts_read",
+    "点赞": "likes_given",
+}
+POSTS_PER_TOPIC_ESTIMATE = 10  # 估算每个话题能读到的帖子数，用于把"已读帖子"差距换算成话题数
+
+# ================== 拟人节奏配置 ==================
+# 刻意的拟人延迟（秒），与等待页面状态的时间分开；PACING_SCALE 可整体缩放，运行中由 PacingScheduler 自适应调整
+PACING_CONFIG = {
+    "between_topics": (5, 10),     # 两个话题之间
+    "scroll_step": (1.5, 3),       # 每次滚动后的阅读停留
+    "after_like": (1.5, 2.5),      # 点赞之后
+    "after_reply": (3, 6),         # 回复之后
+    "typing": (0.5, 2),            # 输入内容前后
+    "before_click": (0.5, 1),      # 滚动到按钮后点击前
+    "http_topic": (1, 3),          # HTTP 引擎两个话题之间
+}
+
 # 回复内容池
 REPLY_TEMPLATES = [
     "感谢分享！",
@@ -37,95 +70,2463 @@ REPLY_TEMPLATES = [
 ]
 
 
-def retry_decorator(retries=3, delay=1):
-    """重试装饰器"""
-    def decorator(func):
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            for attempt in range(retries):
+def retry_decorator(retries=3, delay=1):
+    """重试装饰器"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            for attempt in range(retries):
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    if attempt == retries - 1:
+                        logger.error(f"函数 {func.__name__} 最终执行失败: {str(e)}")
+                        raise
+                    logger.warning(f"函数 {func.__name__} 第 {attempt + 1}/{retries} 次尝试失败: {str(e)}")
+                    time.sleep(delay)
+            return None
+        return wrapper
+    return decorator
+
+
+def timed(name):
+    """计时装饰器：把方法耗时记入实例的 telemetry"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with self.telemetry.span(name):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def wait_until(condition, timeout=10, interval=0.1):
+    """轮询等待条件成立，条件成立立即返回 True，超时返回 False"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if condition():
+                return True
+        except Exception:
+            pass
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(interval)
+
+
+def wait_for_selector(page, selector, visible=False, timeout=10):
+    """等待元素出现（或可见）"""
+    check = (
+        f"const e = document.querySelector({json.dumps(selector)}); return !!(e && e.offsetParent !== null);"
+        if visible
+        else f"return !!document.querySelector({json.dumps(selector)});"
+    )
+    if wait_until(lambda: page.run_js(check), timeout):
+        return True
+    recorder = getattr(page, "flight_recorder", None)
+    if recorder:
+        recorder.record("selector_miss", selector=selector, timeout=timeout)
+    return False
+
+
+def wait_for_app_ready(page, timeout=15):
+    """等待 Discourse 前端应用启动完成（启动画面消失、主区域已渲染）"""
+    return wait_until(
+        lambda: page.run_js(
+            "return document.readyState !== 'loading' && !!document.querySelector('#main-outlet')"
+            " && !document.querySelector('#d-splash');"
+        ),
+        timeout,
+    )
+
+
+# 页面探测：一次 JS 求值只返回需要的字段，避免通过 CDP 拉取整页 HTML
+LOGIN_PROBE_JS = """
+    const user = document.querySelector('#current-user');
+    const avatar = user && user.querySelector('img.avatar');
+    return {
+        logged_in: !!user,
+        username: avatar ? (avatar.getAttribute('title') || avatar.getAttribute('alt') || '') : '',
+        login_button: !!document.querySelector('.login-button, #login-button'),
+        challenge: document.title.includes('Just a moment'),
+    };
+"""
+
+TOPIC_LINKS_JS = """
+    let links = document.querySelectorAll('#list-area .title');
+    if (!links.length) links = document.querySelectorAll('.topic-list-item .title');
+    return Array.from(links, a => ({href: a.href || a.getAttribute('href') || '', title: a.textContent.trim()}));
+"""
+
+PAGE_EXCERPT_JS = """
+    const limit = arguments[0];
+    return {
+        title: document.title,
+        url: location.href,
+        html_length: document.documentElement.outerHTML.length,
+        body_text: (document.body ? document.body.innerText : '').slice(0, limit),
+    };
+"""
+
+
+def probe_login(page):
+    """探测页面登录状态，返回 {logged_in, username, login_button, challenge}"""
+    try:
+        return page.run_js(LOGIN_PROBE_JS) or {}
+    except Exception:
+        return {}
+
+
+def extract_topic_links(page):
+    """一次性读取话题列表中的 [(链接, 标题)]"""
+    try:
+        links = page.run_js(TOPIC_LINKS_JS) or []
+    except Exception as e:
+        logger.debug(f"读取话题列表失败: {e}")
+        return []
+    return [(link["href"], link["title"]) for link in links if link.get("href")]
+
+
+def page_excerpt(page, limit=500):
+    """调试用的页面摘要（标题、地址、HTML 长度和前 limit 个字符的正文）"""
+    try:
+        return page.run_js(PAGE_EXCERPT_JS, limit) or {}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+os.environ.pop("DISPLAY", None)
+os.environ.pop("DYLD_LIBRARY_PATH", None)
+
+USERNAME = os.environ.get("LINUXDO_USERNAME")
+PASSWORD = os.environ.get("LINUXDO_PASSWORD")
+PLAN_ENABLED = os.environ.get("PLAN_ENABLED", "true").strip().lower() not in ["false", "0", "off"]  # 按升级要求差距规划工作量
+BROWSE_ENABLED = os.environ.get("BROWSE_ENABLED", "true").strip().lower() not in ["false", "0", "off"]
+BROWSE_ENGINE = os.environ.get("BROWSE_ENGINE", "browser").strip().lower()  # 浏览引擎: browser / http
+BROWSE_CONCURRENCY = int(os.environ.get("BROWSE_CONCURRENCY", "1"))  # 同时浏览的话题标签页数
+TAB_POOL_ENABLED = os.environ.get("TAB_POOL_ENABLED", "false").strip().lower() in ["true", "1", "on"]  # 复用标签页
+TAB_POOL_MAX_USES = int(os.environ.get("TAB_POOL_MAX_USES", "20"))  # 单个标签页最多复用次数
+TAB_POOL_MAX_HEAP_MB = int(os.environ.get("TAB_POOL_MAX_HEAP_MB", "300"))  # 单个标签页 JS 堆上限
+BROWSER_PROFILE_DIR = os.environ.get("BROWSER_PROFILE_DIR")  # 持久化浏览器配置根目录（每个账号一个子目录），为空时使用无痕模式
+BROWSER_PROFILE_MAX_MB = int(os.environ.get("BROWSER_PROFILE_MAX_MB", "500"))  # 单个配置目录大小上限
+BROWSER_RSS_BUDGET_MB = int(os.environ.get("BROWSER_RSS_BUDGET_MB", "0"))  # 浏览器进程树内存预算，超出后在话题间隙重启浏览器，0 表示不限制
+BROWSER_RENDERER_LIMIT = int(os.environ.get("BROWSER_RENDERER_LIMIT", "4"))  # 渲染进程数上限
+BROWSER_JS_HEAP_MB = int(os.environ.get("BROWSER_JS_HEAP_MB", "512"))  # 单个渲染进程的 JS 堆上限
+MEMORY_SAMPLE_INTERVAL = float(os.environ.get("MEMORY_SAMPLE_INTERVAL", "5"))  # 浏览器内存采样间隔（秒）
+LOGIN_MODE = os.environ.get("LOGIN_MODE", "auto").strip().lower()  # auto: 优先 HTTP 登录; browser: 始终使用浏览器
+TOPIC_INDEX_ENABLED = os.environ.get("TOPIC_INDEX_ENABLED", "true").strip().lower() not in ["false", "0", "off"]  # 本地话题索引
+TOPIC_INDEX_DIR = os.environ.get("TOPIC_INDEX_DIR") or os.environ.get("LINUXDO_DATA_DIR") or os.path.dirname(os.path.abspath(__file__))  # 话题索引目录
+WRITE_MODE = os.environ.get("WRITE_MODE", "auto").strip().lower()  # 点赞/回复方式: auto(HTTP 引擎用接口) / api / browser
+JOURNAL_ENABLED = os.environ.get("JOURNAL_ENABLED", "true").strip().lower() not in ["false", "0", "off"]  # 动作日志与每日额度
+RUNS_PER_DAY = int(os.environ.get("RUNS_PER_DAY", "4"))  # 每天定时运行次数（默认每 6 小时一次），用于分摊每日预算
+PACING_SCALE = float(os.environ.get("PACING_SCALE", "1"))  # 拟人延迟缩放系数，0 表示不做刻意延迟
+RUN_DEADLINE_SECONDS = int(os.environ.get("RUN_DEADLINE_SECONDS", "0"))  # 整次运行的时间预算（秒），0 表示不限制
+RUN_STARTED_AT = time.monotonic()
+BLOCKING_ENABLED = os.environ.get("BLOCKING_ENABLED", "false").strip().lower() in ["true", "1", "on"]  # 拦截无关资源
+BLOCK_RESOURCE_TYPES = os.environ.get("BLOCK_RESOURCE_TYPES", "Image,Media,Font")  # 按资源类型拦截（CDP ResourceType）
+BLOCK_URL_PATTERNS = os.environ.get(
+    "BLOCK_URL_PATTERNS",
+    "*google-analytics.com*,*googletagmanager.com*,*doubleclick.net*,*cloudflareinsights.com*,*.mp4*,*.webm*",
+)  # 按 URL 通配符拦截（第三方统计、视频等）
+
+if not USERNAME:
+    USERNAME = os.environ.get("USERNAME")
+if not PASSWORD:
+    PASSWORD = os.environ.get("PASSWORD")
+
+GOTIFY_URL = os.environ.get("GOTIFY_URL")
+GOTIFY_TOKEN = os.environ.get("GOTIFY_TOKEN")
+SC3_PUSH_KEY = os.environ.get("SC3_PUSH_KEY")
+TG_BOT_TOKEN = os.environ.get("TG_BOT_TOKEN")  # Telegram Bot Token
+TG_CHAT_ID = os.environ.get("TG_CHAT_ID")  # Telegram Chat ID
+WECHAT_API_URL = os.environ.get("WECHAT_API_URL")   # 自定义微信 API 地址
+WECHAT_AUTH_TOKEN = os.environ.get("WECHAT_AUTH_TOKEN") # 自定义微信 Token
+LINUXDO_PROXY = os.environ.get("LINUXDO_PROXY")  # 代理设置，多个代理用逗号分隔
+PROXY_LIST = [p for p in re.split(r"[,\s]+", LINUXDO_PROXY or "") if p]
+PROXY_PROBE_TIMEOUT = float(os.environ.get("PROXY_PROBE_TIMEOUT", "8"))  # 代理探测超时（秒）
+PROXY_MAX_LATENCY_MS = int(os.environ.get("PROXY_MAX_LATENCY_MS", "5000"))  # 运行中平均请求延迟超过该值时切换代理
+PROXY_MAX_ERROR_RATE = float(os.environ.get("PROXY_MAX_ERROR_RATE", "0.5"))  # 运行中请求错误率超过该值时切换代理
+PROXY_BAD_TTL = int(os.environ.get("PROXY_BAD_TTL", "3600"))  # 失败代理的冷却时间（秒），期间后续运行不再探测
+ACCOUNTS_FILE = os.environ.get("LINUXDO_ACCOUNTS_FILE")  # 多账号文件（JSON 列表或每行 username:password）
+FLEET_WORKERS = int(os.environ.get("LINUXDO_FLEET_WORKERS", "3"))  # 多账号模式同时运行的账号数
+
+# 站点地址，基准测试时指向本地替身服务（见 bench.py）
+BASE_URL = (os.environ.get("LINUXDO_BASE_URL") or "https://linux.do").rstrip("/")
+CONNECT_URL = os.environ.get("LINUXDO_CONNECT_URL") or "https://connect.linux.do/"
+SITE_HOST = urlparse(BASE_URL).hostname
+# IP 和 localhost 不能设置带前导点的域 Cookie
+COOKIE_DOMAIN = SITE_HOST if re.fullmatch(r"[\d.]+|localhost", SITE_HOST) else f".{SITE_HOST}"
+HOME_URL = f"{BASE_URL}/"
+LOGIN_URL = f"{BASE_URL}/login"
+SESSION_URL = f"{BASE_URL}/session"
+CSRF_URL = f"{BASE_URL}/session/csrf"
+DATA_DIR = os.environ.get("LINUXDO_DATA_DIR") or os.path.dirname(os.path.abspath(__file__))  # Cookie、发件箱等运行数据目录
+METRICS_DIR = os.environ.get("METRICS_DIR") or DATA_DIR  # 运行指标（JSON / Prometheus textfile）输出目录
+DEBUG_DIR = os.environ.get("DEBUG_DIR") or os.path.join(DATA_DIR, "linuxdo_debug")  # 失败现场（事件记录、DOM、截图）输出目录
+FLIGHT_RECORDER_SIZE = int(os.environ.get("FLIGHT_RECORDER_SIZE", "500"))  # 内存中保留的最近事件数
+DEBUG_MAX_AGE_DAYS = float(os.environ.get("DEBUG_MAX_AGE_DAYS", "7"))  # 失败现场保留天数
+DEBUG_MAX_MB = int(os.environ.get("DEBUG_MAX_MB", "100"))  # 失败现场总大小上限（MB），超出时删除最旧的
+CASSETTE_MODE = os.environ.get("CASSETTE_MODE", "").lower()  # record：录制 HTTP 交换；replay：从录像回放，不访问网络
+CASSETTE_FILE = os.environ.get("LINUXDO_CASSETTE") or os.path.join(DATA_DIR, "linuxdo_cassette.jsonl")  # 录像文件
+CASSETTE_LATENCY_SCALE = float(os.environ.get("CASSETTE_LATENCY_SCALE", "1"))  # 回放延迟 = 录制时的耗时 × 该系数
+COOKIE_FILE = os.path.join(DATA_DIR, "linuxdo_cookies.json")
+NOTIFY_OUTBOX_FILE = os.path.join(DATA_DIR, "linuxdo_outbox.json")
+NOTIFY_OUTBOX_MAX_ATTEMPTS = 8
+CF_CLEARANCE_FILE = os.path.join(DATA_DIR, "linuxdo_cf_clearance.json")  # Cloudflare 验证通过后的 cf_clearance（按出口代理保存）
+CF_CHALLENGE_TIMEOUT = float(os.environ.get("CF_CHALLENGE_TIMEOUT", "45"))  # 等待 Cloudflare 验证通过的最长秒数
+CF_CLEARANCE_DEFAULT_TTL = 1800  # 浏览器未给出过期时间时按 30 分钟处理
+
+# 浏览器与 curl_cffi 共用同一指纹：cf_clearance 绑定 UA，UA 或 TLS 指纹不一致时 HTTP 请求会被重新质询
+IMPERSONATE = "chrome136"
+CHROME_VERSION = re.sub(r"\D", "", IMPERSONATE)
+
+
+def import_psutil():
+    """按需导入可选依赖 psutil（用于采样浏览器内存），未安装时返回 None"""
+    try:
+        import psutil
+        return psutil
+    except ImportError:
+        return None
+
+
+def client_platform():
+    """当前系统对应的 UA 平台标识和 sec-ch-ua-platform"""
+    if sys.platform == "darwin":
+        return "Macintosh; Intel Mac OS X 10_15_7", "macOS"
+    if sys.platform == "win32":
+        return "Windows NT 10.0; Win64; x64", "Windows"
+    return "X11; Linux x86_64", "Linux"
+
+
+# sec-ch-ua-platform -> (navigator.platform, sec-ch-ua-platform-version)
+NAVIGATOR_PLATFORMS = {"macOS": ("MacIntel", "10.15.7"), "Windows": ("Win32", "10.0.0"), "Linux": ("Linux x86_64", "")}
+
+
+def client_brands():
+    """与 IMPERSONATE 一致的 UA-CH 品牌列表"""
+    return [
+        {"brand": "Chromium", "version": CHROME_VERSION},
+        {"brand": "Google Chrome", "version": CHROME_VERSION},
+        {"brand": "Not.A/Brand", "version": "99"},
+    ]
+
+
+def user_agent():
+    """浏览器和 curl_cffi Session 共用的 UA，Chrome 版本与 IMPERSONATE 一致"""
+    platformIdentifier, _ = client_platform()
+    return f"Mozilla/5.0 ({platformIdentifier}) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{CHROME_VERSION}.0.0.0 Safari/537.36"
+
+
+def client_hint_headers():
+    """与 UA 对应的 Client Hints，避免沿用 curl_cffi 默认的 macOS 标识"""
+    _, platform_name = client_platform()
+    return {
+        "sec-ch-ua": ", ".join(f'"{b["brand"]}";v="{b["version"]}"' for b in client_brands()),
+        "sec-ch-ua-mobile": "?0",
+        "sec-ch-ua-platform": f'"{platform_name}"',
+    }
+
+
+def apply_user_agent(page):
+    """让标签页的 UA 和 UA-CH（sec-ch-ua 请求头、navigator.userAgentData）都与 curl_cffi 的 IMPERSONATE 一致
+
+    启动参数只能改 UA 字符串，Client Hints 仍是实际安装的 Chromium 版本；浏览器拿到的 cf_clearance
+    交给 Session 复用时，两边指纹必须一致。
+    """
+    _, platform_name = client_platform()
+    navigator_platform, platform_version = NAVIGATOR_PLATFORMS[platform_name]
+    brands = client_brands()
+    try:
+        page.run_cdp(
+            "Emulation.setUserAgentOverride",
+            userAgent=user_agent(),
+            acceptLanguage="zh-CN,zh;q=0.9",
+            platform=navigator_platform,
+            userAgentMetadata={
+                "brands": brands,
+                "fullVersionList": [dict(b, version=f"{b['version']}.0.0.0") for b in brands],
+                "platform": platform_name,
+                "platformVersion": platform_version,
+                "architecture": "x86",
+                "bitness": "64",
+                "model": "",
+                "mobile": False,
+            },
+        )
+    except Exception as e:
+        logger.debug(f"设置 UA Client Hints 失败: {e}")
+
+
+def build_chromium_options(proxy=None, profile_dir=None):
+    """构建浏览器启动参数"""
+    from DrissionPage import ChromiumOptions
+
+    co = (
+        ChromiumOptions()
+        .headless(True)
+        .incognito(not profile_dir)
+        .set_argument("--no-sandbox")
+        .set_argument("--disable-gpu")
+        .set_argument("--disable-dev-shm-usage")
+        .set_argument("--disable-extensions")
+        .set_argument("--window-size=1920,1080")
+        # 限制渲染进程数和 JS 堆，避免小内存容器被 OOM
+        .set_argument(f"--renderer-process-limit={BROWSER_RENDERER_LIMIT}")
+        .set_argument(f"--js-flags=--max-old-space-size={BROWSER_JS_HEAP_MB}")
+    )
+    if profile_dir:
+        # 持久化配置：保留 HTTP 缓存和 Service Worker 缓存，磁盘缓存占配置上限的一半
+        co.set_user_data_path(profile_dir)
+        co.set_local_port(find_free_port())
+        co.set_argument(f"--disk-cache-size={BROWSER_PROFILE_MAX_MB * 1024 * 1024 // 2}")
+    if proxy:
+        co.set_proxy(proxy)
+    co.set_user_agent(user_agent())
+    return co
+
+
+def find_free_port():
+    """获取一个空闲的本地端口"""
+    import socket
+
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def safe_account_name(username):
+    """将账号名转换为可用于文件名的形式"""
+    return re.sub(r"[^0-9A-Za-z_.-]", "_", username or "default")
+
+
+def cookie_file_for(username):
+    """多账号模式下每个账号独立的 Cookie 文件"""
+    return os.path.join(DATA_DIR, f"linuxdo_cookies_{safe_account_name(username)}.json")
+
+
+def dir_size(path):
+    """统计目录总大小（字节）"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def lock_profile(path):
+    """对配置目录加排他锁，防止并发运行损坏配置，已被占用时返回 None"""
+    handle = open(os.path.join(path, ".linuxdo.lock"), "a+")
+    try:
+        if os.name == "nt":
+            import msvcrt
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return handle
+    except OSError:
+        handle.close()
+        return None
+
+
+def prepare_profile(username):
+    """准备账号的持久化配置目录：加锁并在超出大小上限时清理缓存
+
+    返回 (目录, 锁)，目录被其他进程占用时返回 (None, None)，此时回退到无痕模式
+    """
+    import shutil
+
+    path = os.path.join(os.path.abspath(BROWSER_PROFILE_DIR), safe_account_name(username))
+    os.makedirs(path, exist_ok=True)
+    lock = lock_profile(path)
+    if not lock:
+        logger.warning(f"配置目录 {path} 正被其他任务使用，本次使用无痕模式")
+        return None, None
+
+    size = dir_size(path)
+    if size > BROWSER_PROFILE_MAX_MB * 1024 * 1024:
+        logger.info(f"配置目录 {size / 1024 / 1024:.0f}MB 超出上限 {BROWSER_PROFILE_MAX_MB}MB，清理缓存")
+        for sub in ("Cache", "Code Cache", "GPUCache", os.path.join("Service Worker", "CacheStorage")):
+            shutil.rmtree(os.path.join(path, "Default", sub), ignore_errors=True)
+    logger.info(f"使用持久化配置目录: {path}")
+    return path, lock
+
+
+class TrafficMeter:
+    """通过 CDP Network 事件统计缓存命中字节数与网络传输字节数"""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.cached_ids = {}
+        self.cache_bytes = 0
+        self.cache_hits = 0
+        self.network_bytes = 0
+        self.network_requests = 0
+        self.first_paint_ms = None
+
+    def attach(self, page):
+        """为标签页注册网络事件回调"""
+        try:
+            add_cdp_callback(page, "Network.responseReceived", self.on_response)
+            add_cdp_callback(page, "Network.dataReceived", self.on_data)
+            add_cdp_callback(page, "Network.loadingFinished", self.on_finished)
+            page.run_cdp("Network.enable")
+        except Exception as e:
+            logger.debug(f"注册流量统计失败: {e}")
+
+    def on_response(self, **kwargs):
+        response = kwargs.get("response", {})
+        if response.get("fromDiskCache") or response.get("fromServiceWorker") or response.get("fromPrefetchCache"):
+            with self.lock:
+                self.cached_ids[kwargs.get("requestId")] = 0
+
+    def on_data(self, **kwargs):
+        request_id = kwargs.get("requestId")
+        with self.lock:
+            if request_id in self.cached_ids:
+                self.cached_ids[request_id] += kwargs.get("dataLength", 0)
+
+    def on_finished(self, **kwargs):
+        request_id = kwargs.get("requestId")
+        with self.lock:
+            if request_id in self.cached_ids:
+                self.cache_bytes += self.cached_ids.pop(request_id)
+                self.cache_hits += 1
+            else:
+                self.network_bytes += int(kwargs.get("encodedDataLength", 0))
+                self.network_requests += 1
+
+    def record_paint(self, page):
+        """记录首个页面的 first-contentful-paint"""
+        if self.first_paint_ms is not None:
+            return
+        try:
+            self.first_paint_ms = page.run_js(
+                "const e = performance.getEntriesByName('first-contentful-paint')[0]; return e ? e.startTime : null;"
+            )
+        except Exception:
+            pass
+
+    def summary(self):
+        """流量统计摘要"""
+        text = (
+            f"缓存命中 {self.cache_hits} 个 / {self.cache_bytes / 1024 / 1024:.2f}MB, "
+            f"网络传输 {self.network_requests} 个 / {self.network_bytes / 1024 / 1024:.2f}MB"
+        )
+        if self.first_paint_ms is not None:
+            text += f", 首屏绘制 {self.first_paint_ms:.0f}ms"
+        return text
+
+
+def observe_cdp(page, observer):
+    """为标签页的 CDP 调用注册观察者 observer(method, kwargs, result, ms)
+
+    DrissionPage 的 CDP 调用都经过 driver.run；这里只包装一次，所有观察者共用同一层包装。
+    """
+    driver = page._driver
+    observers = getattr(driver, "cdp_observers", None)
+    if observers is None:
+        observers = driver.cdp_observers = []
+        run = driver.run
+
+        def observed_run(method, **kwargs):
+            start = time.perf_counter()
+            result = run(method, **kwargs)
+            ms = (time.perf_counter() - start) * 1000
+            for observe in observers:
+                observe(method, kwargs, result, ms)
+            return result
+
+        driver.run = observed_run
+    if observer not in observers:
+        observers.append(observer)
+
+
+class Telemetry:
+    """分阶段计时，统计 CDP 调用、HTTP 请求与浏览器峰值内存，运行结束时导出 JSON 报告与 Prometheus textfile"""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.spans = {}  # 名称 -> [次数, 总耗时, 最大耗时]
+        self.samples = {}  # 名称 -> 每次耗时，用于计算分位数
+        self.counters = {}
+        self.peak_rss = 0
+        self.rss_total = 0
+        self.rss_samples = 0
+
+    @contextlib.contextmanager
+    def span(self, name):
+        """计时区间"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def observe(self, name, seconds):
+        with self.lock:
+            stat = self.spans.setdefault(name, [0, 0.0, 0.0])
+            stat[0] += 1
+            stat[1] += seconds
+            stat[2] = max(stat[2], seconds)
+            self.samples.setdefault(name, []).append(seconds)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def instrument_page(self, page):
+        """统计标签页发出的 CDP 调用次数，以及命令结果在 WebSocket 上的原始字节数（不重新序列化）"""
+        observe_cdp(page, self.on_cdp)
+        ws = page._driver._ws
+        if ws is None or getattr(ws, "counted", False):
+            return
+        recv = ws.recv
+
+        def counted_recv():
+            message = recv()
+            # 命令结果以 "id" 开头，事件以 "method" 开头，只统计前者
+            if message.startswith('{"id"'):
+                self.count("cdp_bytes", len(message))
+            return message
+
+        ws.recv = counted_recv
+        ws.counted = True
+
+    def on_cdp(self, method, kwargs, result, ms):
+        self.count("cdp_calls")
+
+    def instrument_session(self, session):
+        """统计 Session 发出的 HTTP 请求"""
+        request = session.request
+
+        def counted_request(*args, **kwargs):
+            self.count("http_requests")
+            return request(*args, **kwargs)
+
+        session.request = counted_request
+
+    def sample_rss(self, pid):
+        """采样浏览器进程树的 RSS 并更新峰值与均值（需要 psutil），返回本次采样值"""
+        psutil = import_psutil()
+        if psutil is None or not pid:
+            return 0
+        try:
+            proc = psutil.Process(pid)
+            rss = proc.memory_info().rss
+            children = proc.children(recursive=True)
+        except psutil.Error:
+            return 0
+        for child in children:
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                pass
+        with self.lock:
+            self.peak_rss = max(self.peak_rss, rss)
+            self.rss_total += rss
+            self.rss_samples += 1
+        return rss
+
+    @property
+    def avg_rss(self):
+        return self.rss_total // self.rss_samples if self.rss_samples else 0
+
+    def percentile(self, name, q):
+        samples = sorted(self.samples.get(name, []))
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "duration_seconds": round(time.time() - self.started_at, 3),
+                "spans": {
+                    name: {
+                        "count": count,
+                        "total_seconds": round(total, 3),
+                        "max_seconds": round(peak, 3),
+                        "p50_seconds": round(self.percentile(name, 0.5), 3),
+                        "p90_seconds": round(self.percentile(name, 0.9), 3),
+                    }
+                    for name, (count, total, peak) in self.spans.items()
+                },
+                "counters": dict(self.counters),
+                "peak_rss_bytes": self.peak_rss,
+                "avg_rss_bytes": self.avg_rss,
+            }
+
+    def summary(self):
+        """耗时摘要"""
+        with self.lock:
+            parts = [
+                f"{name} {count}次/{total:.1f}s"
+                for name, (count, total, _) in sorted(self.spans.items(), key=lambda item: item[1][1], reverse=True)
+            ]
+            parts += [f"{name} {value}" for name, value in self.counters.items()]
+            if self.peak_rss:
+                parts.append(
+                    f"浏览器内存 峰值 {self.peak_rss / 1024 / 1024:.0f}MB / 平均 {self.avg_rss / 1024 / 1024:.0f}MB"
+                )
+        return ", ".join(parts)
+
+    @staticmethod
+    def prom_labels(labels):
+        escaped = (
+            (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+            for key, value in labels.items()
+        )
+        return ",".join(f'{key}="{value}"' for key, value in escaped)
+
+    def write(self, path_prefix, labels, report):
+        """写出 {path_prefix}.json 与 {path_prefix}.prom（先写临时文件再替换，避免采集到半个文件）"""
+        report = dict(report, **self.snapshot())
+        base = self.prom_labels(labels)
+        lines = [
+            "# TYPE linuxdo_run_duration_seconds gauge",
+            f"linuxdo_run_duration_seconds{{{base}}} {report['duration_seconds']}",
+            "# TYPE linuxdo_run_exit_code gauge",
+            f"linuxdo_run_exit_code{{{base}}} {report['exit_code']}",
+            "# TYPE linuxdo_run_timestamp_seconds gauge",
+            f"linuxdo_run_timestamp_seconds{{{base}}} {int(self.started_at)}",
+            "# TYPE linuxdo_browser_peak_rss_bytes gauge",
+            f"linuxdo_browser_peak_rss_bytes{{{base}}} {report['peak_rss_bytes']}",
+            "# TYPE linuxdo_browser_avg_rss_bytes gauge",
+            f"linuxdo_browser_avg_rss_bytes{{{base}}} {report['avg_rss_bytes']}",
+            "# TYPE linuxdo_span_seconds summary",
+        ]
+        for name, span in report["spans"].items():
+            span_labels = self.prom_labels(dict(labels, span=name))
+            for quantile in ("0.5", "0.9"):
+                quantile_labels = self.prom_labels(dict(labels, span=name, quantile=quantile))
+                value = span["p50_seconds"] if quantile == "0.5" else span["p90_seconds"]
+                lines.append(f"linuxdo_span_seconds{{{quantile_labels}}} {value}")
+            lines.append(f"linuxdo_span_seconds_sum{{{span_labels}}} {span['total_seconds']}")
+            lines.append(f"linuxdo_span_seconds_count{{{span_labels}}} {span['count']}")
+        lines.append("# TYPE linuxdo_span_max_seconds gauge")
+        for name, span in report["spans"].items():
+            lines.append(f"linuxdo_span_max_seconds{{{self.prom_labels(dict(labels, span=name))}}} {span['max_seconds']}")
+        for name, value in report["counters"].items():
+            lines.append(f"# TYPE linuxdo_{name}_total counter")
+            lines.append(f"linuxdo_{name}_total{{{base}}} {value}")
+        lines.append("# TYPE linuxdo_progress gauge")
+        for name, value in report.get("stats", {}).items():
+            lines.append(f"linuxdo_progress{{{self.prom_labels(dict(labels, stat=name))}}} {value}")
+
+        for path, content in (
+            (f"{path_prefix}.json", json.dumps(report, indent=2, ensure_ascii=False)),
+            (f"{path_prefix}.prom", "\n".join(lines) + "\n"),
+        ):
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+
+
+class FlightRecorder:
+    """飞行记录仪：在内存环形缓冲区中保留最近的导航、选择器未命中、JS 结果和 HTTP 请求
+
+    正常运行时只追加元组，不做格式化和 IO；运行失败时把事件连同压缩的 DOM 和截图写到 DEBUG_DIR，
+    并按保留天数和总大小清理旧的记录。
+    """
+
+    JS_METHODS = ("Runtime.callFunctionOn", "Runtime.evaluate")
+
+    def __init__(self, size: int = FLIGHT_RECORDER_SIZE, directory: str = DEBUG_DIR) -> None:
+        from collections import deque
+
+        self.events = deque(maxlen=size)
+        self.directory = directory
+
+    def record(self, kind, **fields):
+        """追加一条事件（deque.append 线程安全）"""
+        self.events.append((time.time(), kind, fields))
+
+    @staticmethod
+    def brief(value):
+        """JS 返回值的简短形式，只截断字符串，不序列化复杂对象"""
+        if value is None or isinstance(value, (bool, int, float)):
+            return value
+        if isinstance(value, str):
+            return value[:200]
+        return f"<{type(value).__name__}>"
+
+    def instrument_page(self, page):
+        """记录标签页上的 JS 求值及其结果、耗时"""
+        page.flight_recorder = self
+        observe_cdp(page, self.on_cdp)
+
+    def on_cdp(self, method, kwargs, result, ms):
+        if method not in self.JS_METHODS:
+            return
+        code = kwargs.get("functionDeclaration") or kwargs.get("expression") or ""
+        value = (result.get("result") or {}).get("value") if isinstance(result, dict) else None
+        self.record(
+            "js", code=code[:120], value=self.brief(value), ms=round(ms, 1),
+            error=(result.get("error") or result.get("exceptionDetails")) if isinstance(result, dict) else None,
+        )
+
+    def instrument_session(self, session):
+        """记录 Session 发出的 HTTP 请求的状态码和耗时"""
+        request = session.request
+
+        def recorded_request(method, url, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                resp = request(method, url, *args, **kwargs)
+            except Exception as e:
+                self.record("http", method=method, url=url, error=str(e)[:200],
+                            ms=round((time.perf_counter() - start) * 1000, 1))
+                raise
+            self.record("http", method=method, url=url, status=resp.status_code,
+                        ms=round((time.perf_counter() - start) * 1000, 1))
+            return resp
+
+        session.request = recorded_request
+
+    def dump(self, reason, account, page=None):
+        """把事件、压缩的 DOM 和截图写到新的失败现场目录，返回目录路径"""
+        import gzip
+
+        path = os.path.join(
+            self.directory, f"linuxdo_debug_{safe_account_name(account)}_{time.strftime('%Y%m%d_%H%M%S')}"
+        )
+        os.makedirs(path, exist_ok=True)
+        events = [{"ts": round(ts, 3), "kind": kind, **fields} for ts, kind, fields in list(self.events)]
+        with open(os.path.join(path, "events.json"), 'w', encoding='utf-8') as f:
+            json.dump({"reason": reason, "account": account, "events": events}, f, indent=2, ensure_ascii=False, default=str)
+        if page is not None:
+            try:
+                with gzip.open(os.path.join(path, "dom.html.gz"), 'wt', encoding='utf-8') as f:
+                    f.write(f"<!-- {page.url} -->\n{page.html}")
+            except Exception as e:
+                logger.debug(f"保存 DOM 失败: {e}")
+            try:
+                page.get_screenshot(path=os.path.join(path, "screenshot.png"))
+            except Exception as e:
+                logger.debug(f"保存截图失败: {e}")
+        self.prune()
+        return path
+
+    def prune(self, max_age_days: float = DEBUG_MAX_AGE_DAYS, max_mb: int = DEBUG_MAX_MB):
+        """删除超过保留天数的失败现场，总大小仍超出上限时从最旧的开始删除"""
+        import shutil
+
+        try:
+            dumps = sorted(
+                (os.path.getmtime(p), dir_size(p), p)
+                for p in (os.path.join(self.directory, name) for name in os.listdir(self.directory))
+                if os.path.isdir(p) and os.path.basename(p).startswith("linuxdo_debug_")
+            )
+        except OSError:
+            return
+        cutoff = time.time() - max_age_days * 86400
+        total = sum(size for _, size, _ in dumps)
+        # 最新的一份始终保留
+        for mtime, size, p in dumps[:-1]:
+            if mtime >= cutoff and total <= max_mb * 1024 * 1024:
+                break
+            shutil.rmtree(p, ignore_errors=True)
+            total -= size
+
+
+class Cassette:
+    """HTTP 录像：录制 curl_cffi Session 和浏览器标签页的请求与响应，回放时在本地按原始（或缩放后的）延迟返回
+
+    录像为 JSONL，第一行是元数据（站点地址、随机种子和录制开始时的 Cookie 文件），之后每行一次交换。
+    回放时先按 方法 + URL 依次匹配；URL 没有录到时按路径形状（数字替换为 {n}）轮流使用同类请求的响应，
+    仍未命中时 HTTP 返回 404、浏览器请求直接失败。录像中包含 Cookie 和通知渠道的 URL（含 token），不要分享。
+    """
+
+    SEED = 20240101
+    # 录制的是解压后的响应体，去掉与原始传输相关的头
+    DROP_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+    def __init__(self, path: str = CASSETTE_FILE, mode: str = CASSETTE_MODE, latency_scale: float = CASSETTE_LATENCY_SCALE) -> None:
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.lock = threading.Lock()
+        self.exact = {}
+        self.shapes = {}
+        self.cursors = {}
+        self.pending = {}
+        self.recorded = 0
+        self.hits = 0
+        self.substituted = 0
+        self.misses = 0
+        if mode == "replay":
+            self.load()
+        else:
+            self.start_recording()
+        # 固定随机种子，让录制和回放挑选相同的话题、帖子
+        random.seed(self.SEED)
+
+    def start_recording(self):
+        """新建录像，写入元数据和当前的 Cookie 文件（回放时在空数据目录中还原）"""
+        files = {}
+        for name in sorted(os.listdir(DATA_DIR)) if os.path.isdir(DATA_DIR) else []:
+            if name.startswith("linuxdo_cookies") or name == os.path.basename(CF_CLEARANCE_FILE):
+                with open(os.path.join(DATA_DIR, name), 'r', encoding='utf-8') as f:
+                    files[name] = f.read()
+        meta = {
+            "type": "meta", "recorded_at": int(time.time()), "base_url": BASE_URL, "connect_url": CONNECT_URL,
+            "seed": self.SEED, "engine": BROWSE_ENGINE, "concurrency": BROWSE_CONCURRENCY, "files": files,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(meta, ensure_ascii=False) + "\n")
+        logger.info(f"录制 HTTP 交换到 {self.path}")
+
+    def load(self):
+        """读取录像，按 URL 和路径形状建立索引"""
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry.get("type") == "meta":
+                    self.SEED = entry.get("seed", self.SEED)
+                    continue
+                self.exact.setdefault((entry["method"], self.normalize(entry["url"])), []).append(entry)
+                self.shapes.setdefault(self.shape(entry["method"], entry["url"]), []).append(entry)
+        logger.info(f"从 {self.path} 回放 {sum(len(v) for v in self.exact.values())} 次 HTTP 交换")
+
+    @staticmethod
+    def normalize(url):
+        """去掉片段和缓存参数（_=时间戳），查询参数排序"""
+        parsed = urlparse(url)
+        query = "&".join(sorted(p for p in parsed.query.split("&") if p and not p.startswith("_=")))
+        return f"{parsed.scheme}://{parsed.netloc}{parsed.path}" + (f"?{query}" if query else "")
+
+    @staticmethod
+    def shape(method, url):
+        """请求的路径形状，例如 GET linux.do/t/{n}.json"""
+        parsed = urlparse(url)
+        path = re.sub(r"\d+", "{n}", parsed.path)
+        return f"{method} {parsed.netloc}{path}"
+
+    def record(self, source, method, url, status, headers, body, elapsed_ms):
+        """追加一次交换"""
+        entry = {
+            "source": source,
+            "method": method.upper(),
+            "url": url,
+            "status": status,
+            "headers": [[k, v] for k, v in headers if k.lower() not in self.DROP_HEADERS],
+            "elapsed_ms": round(elapsed_ms, 1),
+        }
+        try:
+            entry["body"] = body.decode("utf-8")
+        except UnicodeDecodeError:
+            import base64
+
+            entry["body"] = base64.b64encode(body).decode("ascii")
+            entry["base64"] = True
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+            self.recorded += 1
+
+    def lookup(self, method, url):
+        """回放时查找响应：同一 URL 按录制顺序依次返回（用完后重复最后一个），否则借用同类请求"""
+        method = method.upper()
+        with self.lock:
+            entries = self.exact.get((method, self.normalize(url)))
+            if entries:
+                self.hits += 1
+                return entries.pop(0) if len(entries) > 1 else entries[0]
+            shape = self.shape(method, url)
+            similar = self.shapes.get(shape)
+            if similar:
+                index = self.cursors.get(shape, 0)
+                self.cursors[shape] = index + 1
+                self.substituted += 1
+                return similar[index % len(similar)]
+            self.misses += 1
+        logger.debug(f"录像未命中: {method} {url}")
+        return None
+
+    @staticmethod
+    def body(entry):
+        if entry.get("base64"):
+            import base64
+
+            return base64.b64decode(entry["body"])
+        return entry["body"].encode("utf-8")
+
+    def delay(self, entry):
+        """回放延迟（秒）"""
+        return entry["elapsed_ms"] / 1000 * self.latency_scale
+
+    def build_response(self, session, url, entry):
+        """用录像条目构造 curl_cffi 响应，并把 Set-Cookie 写入 Session"""
+        from http.cookies import SimpleCookie
+        from curl_cffi.requests import Headers, Response
+
+        resp = Response()
+        resp.url = url
+        if entry is None:
+            resp.status_code, resp.reason, resp.ok = 404, "Not Found", False
+            return resp
+        resp.status_code = entry["status"]
+        resp.ok = entry["status"] < 400
+        resp.headers = Headers([tuple(header) for header in entry["headers"]])
+        resp.content = self.body(entry)
+        for value in resp.headers.get_list("set-cookie"):
+            cookie = SimpleCookie()
+            try:
+                cookie.load(value)
+            except Exception:
+                continue
+            for name, morsel in cookie.items():
+                domain = morsel["domain"] or urlparse(url).hostname
+                if morsel["max-age"] == "0":
+                    session.cookies.delete(name, domain=domain)
+                else:
+                    session.cookies.set(name, morsel.value, domain=domain)
+        return resp
+
+    def instrument_session(self, session):
+        """录制或回放 Session 的请求（需在其他统计包装之前调用，回放的请求同样计入统计）"""
+        request = session.request
+        if self.mode == "replay":
+            def replayed_request(method, url, *args, **kwargs):
+                entry = self.lookup(method, url)
+                if entry is not None:
+                    time.sleep(self.delay(entry))
+                return self.build_response(session, url, entry)
+
+            session.request = replayed_request
+            return
+
+        def recorded_request(method, url, *args, **kwargs):
+            start = time.perf_counter()
+            resp = request(method, url, *args, **kwargs)
+            self.record(
+                "http", method, resp.url or url, resp.status_code, resp.headers.multi_items(), resp.content,
+                (time.perf_counter() - start) * 1000,
+            )
+            return resp
+
+        session.request = recorded_request
+
+    def instrument_async_session(self, session):
+        """录制或回放 AsyncSession（通知渠道）的请求"""
+        request = session.request
+        if self.mode == "replay":
+            async def replayed_request(method, url, *args, **kwargs):
+                entry = self.lookup(method, url)
+                if entry is not None:
+                    await asyncio.sleep(self.delay(entry))
+                return self.build_response(session, url, entry)
+
+            session.request = replayed_request
+            return
+
+        async def recorded_request(method, url, *args, **kwargs):
+            start = time.perf_counter()
+            resp = await request(method, url, *args, **kwargs)
+            self.record(
+                "notify", method, resp.url or url, resp.status_code, resp.headers.multi_items(), resp.content,
+                (time.perf_counter() - start) * 1000,
+            )
+            return resp
+
+        session.request = recorded_request
+
+    def attach(self, page):
+        """为标签页启用录制（Network 事件）或回放（Fetch 拦截，回放时接管请求拦截器）"""
+        try:
+            if self.mode == "replay":
+                add_cdp_callback(page, "Fetch.requestPaused", functools.partial(self.on_paused, page), immediate=True)
+                enable_fetch(page, [{"urlPattern": "*", "requestStage": "Request"}])
+                return
+            add_cdp_callback(page, "Network.requestWillBeSent", functools.partial(self.on_request, page))
+            add_cdp_callback(page, "Network.responseReceived", functools.partial(self.on_response, page))
+            add_cdp_callback(
+                page, "Network.responseReceivedExtraInfo", functools.partial(self.on_extra_info, page)
+            )
+            add_cdp_callback(page, "Network.loadingFinished", functools.partial(self.on_finished, page))
+            page.run_cdp("Network.enable")
+        except Exception as e:
+            logger.debug(f"标签页录像失败: {e}")
+
+    def on_request(self, page, **kwargs):
+        key = (page.tab_id, kwargs.get("requestId"))
+        request = kwargs.get("request", {})
+        with self.lock:
+            previous = self.pending.pop(key, None)
+            self.pending[key] = {"method": request.get("method", "GET"), "url": request.get("url", ""),
+                                 "start": kwargs.get("timestamp", 0)}
+        redirect = kwargs.get("redirectResponse")
+        if previous and redirect:
+            # 同一个 requestId 的重定向：先记下 3xx 响应
+            self.record(
+                "browser", previous["method"], previous["url"], redirect.get("status", 302),
+                list((redirect.get("headers") or {}).items()), b"",
+                (kwargs.get("timestamp", 0) - previous["start"]) * 1000,
+            )
+
+    def on_response(self, page, **kwargs):
+        response = kwargs.get("response", {})
+        with self.lock:
+            pending = self.pending.get((page.tab_id, kwargs.get("requestId")))
+            if pending is not None:
+                pending["status"] = response.get("status", 200)
+                pending.setdefault("headers", response.get("headers") or {})
+
+    def on_extra_info(self, page, **kwargs):
+        # 原始响应头才包含 Set-Cookie（多个值以换行分隔）
+        with self.lock:
+            pending = self.pending.setdefault((page.tab_id, kwargs.get("requestId")), {})
+            pending["headers"] = kwargs.get("headers") or {}
+
+    def on_finished(self, page, **kwargs):
+        with self.lock:
+            pending = self.pending.pop((page.tab_id, kwargs.get("requestId")), None)
+        if not pending or "status" not in pending:
+            return
+        body = b""
+        try:
+            result = page.run_cdp("Network.getResponseBody", requestId=kwargs["requestId"])
+            if result.get("base64Encoded"):
+                import base64
+
+                body = base64.b64decode(result.get("body", ""))
+            else:
+                body = result.get("body", "").encode("utf-8")
+        except Exception:
+            pass
+        headers = [
+            (name, line) for name, value in pending.get("headers", {}).items() for line in str(value).split("\n")
+        ]
+        self.record(
+            "browser", pending["method"], pending["url"], pending["status"], headers, body,
+            (kwargs.get("timestamp", 0) - pending["start"]) * 1000,
+        )
+
+    def on_paused(self, page, **kwargs):
+        import base64
+
+        # 响应阶段的暂停来自资源拦截，由 RequestBlocker 处理
+        if is_response_stage(kwargs):
+            return
+        request = kwargs.get("request", {})
+        entry = self.lookup(request.get("method", "GET"), request.get("url", ""))
+        try:
+            if entry is None:
+                page.run_cdp("Fetch.failRequest", requestId=kwargs["requestId"], errorReason="InternetDisconnected")
+                return
+            time.sleep(self.delay(entry))
+            page.run_cdp(
+                "Fetch.fulfillRequest",
+                requestId=kwargs["requestId"],
+                responseCode=entry["status"],
+                responseHeaders=[{"name": k, "value": v} for k, v in entry["headers"]],
+                body=base64.b64encode(self.body(entry)).decode("ascii"),
+            )
+        except Exception as e:
+            logger.debug(f"回放浏览器请求失败: {e}")
+
+    def summary(self):
+        """录像统计摘要"""
+        if self.mode == "replay":
+            return f"回放 命中 {self.hits} / 同类替代 {self.substituted} / 未命中 {self.misses}"
+        return f"录制 {self.recorded} 次交换 → {self.path}"
+
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette():
+    """进程内共享的 HTTP 录像，未启用录制/回放时返回 None"""
+    global _cassette
+    if CASSETTE_MODE not in ("record", "replay"):
+        return None
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette()
+        return _cassette
+
+
+def is_cf_challenge(resp):
+    """判断响应是否为 Cloudflare 验证页"""
+    if resp.status_code not in (403, 429, 503):
+        return False
+    return resp.headers.get("cf-mitigated") == "challenge" or "Just a moment" in resp.text
+
+
+CF_CLEARANCE_LOCK = threading.Lock()
+
+
+def load_cf_clearance(proxy):
+    """读取当前出口下未过期且 UA 一致的 cf_clearance，没有时返回 None"""
+    try:
+        with open(CF_CLEARANCE_FILE, 'r', encoding='utf-8') as f:
+            entry = json.load(f).get(proxy or "direct")
+    except (OSError, ValueError):
+        return None
+    # cf_clearance 绑定 UA 和出口 IP，升级指纹后旧的验证结果不再有效；提前 1 分钟视为过期
+    if not entry or entry.get("user_agent") != user_agent() or entry.get("expires", 0) <= time.time() + 60:
+        return None
+    return entry
+
+
+def save_cf_clearance(proxy, entry):
+    """按出口保存 cf_clearance，entry 为 None 时删除（验证已失效），顺带清理过期记录"""
+    with CF_CLEARANCE_LOCK:
+        try:
+            with open(CF_CLEARANCE_FILE, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = {}
+        entries = {k: v for k, v in entries.items() if v.get("expires", 0) > time.time()}
+        if entry is None:
+            entries.pop(proxy or "direct", None)
+        else:
+            entries[proxy or "direct"] = entry
+        try:
+            tmp_file = f"{CF_CLEARANCE_FILE}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_file, CF_CLEARANCE_FILE)
+        except Exception as e:
+            logger.warning(f"保存 cf_clearance 失败: {e}")
+
+
+def rate_limit_wait(resp):
+    """从 429 / Retry-After / Discourse rate_limit 错误中解析等待秒数，未限流时返回 None"""
+    data = {}
+    if resp.status_code in (422, 429):
+        try:
+            data = resp.json()
+        except Exception:
+            data = {}
+    if resp.status_code != 429 and data.get("error_type") != "rate_limit":
+        return None
+    retry_after = resp.headers.get("Retry-After")
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    wait_seconds = (data.get("extras") or {}).get("wait_seconds")
+    return float(wait_seconds) if wait_seconds is not None else 10.0
+
+
+class ProxyPool:
+    """代理池：启动时并发探测延迟和站点可达性，挑选最快的健康代理
+
+    每个账号固定使用同一个代理（保持 Cookie 和 Cloudflare 放行状态有效），运行中延迟或错误率超过阈值时切换；
+    健康记录保存在磁盘，近期失败的代理在后续运行中不再探测。
+    """
+
+    WINDOW = 10  # 运行中按最近多少个请求判断是否切换
+    MIN_SAMPLES = 5
+    CF_PENALTY_MS = 5000  # 被 Cloudflare 质询的代理仍可用（浏览器能过验证），但排在后面
+
+    def __init__(self, proxies, path) -> None:
+        self.proxies = proxies
+        self.path = path
+        self.lock = threading.Lock()
+        self.health = {}  # 代理 -> {"latency_ms", "ok", "fail", "bad_until"}
+        self.sticky = {}  # 账号 -> 代理
+        self.recent = {}  # 代理 -> 最近请求 [(是否成功, 耗时 ms)]
+        self.probed = False
+        self.probe_lock = threading.Lock()  # 多个账号同时首次选代理时只探测一次
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.health = data.get("health", {})
+            self.sticky = data.get("sticky", {})
+        except Exception as e:
+            logger.warning(f"读取代理健康记录失败: {e}")
+
+    def save(self):
+        try:
+            with self.lock:
+                content = json.dumps({"health": self.health, "sticky": self.sticky}, indent=2, ensure_ascii=False)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"保存代理健康记录失败: {e}")
+
+    def probe(self, proxy):
+        """探测代理：TCP 建连耗时 + 经代理访问站点的 TLS 往返，返回延迟（毫秒），不可用时抛出异常"""
+        import socket
+        from curl_cffi import requests
+
+        parsed = urlparse(proxy if "://" in proxy else f"http://{proxy}")
+        default_port = 1080 if parsed.scheme.startswith("socks") else 8080
+        start = time.perf_counter()
+        with socket.create_connection((parsed.hostname, parsed.port or default_port), timeout=PROXY_PROBE_TIMEOUT):
+            pass
+        tcp_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        resp = requests.get(
+            f"{BASE_URL}/srv/status",
+            proxies={"http": proxy, "https": proxy},
+            impersonate=IMPERSONATE,
+            timeout=PROXY_PROBE_TIMEOUT,
+        )
+        latency = tcp_ms + (time.perf_counter() - start) * 1000
+        if is_cf_challenge(resp):
+            return latency + self.CF_PENALTY_MS
+        if resp.status_code >= 500:
+            raise RuntimeError(f"HTTP {resp.status_code}")
+        return latency
+
+    def probe_all(self):
+        """并发探测所有未被标记为失败的代理"""
+        from concurrent.futures import ThreadPoolExecutor
+
+        now = time.time()
+        candidates = [p for p in self.proxies if self.health.get(p, {}).get("bad_until", 0) <= now]
+        skipped = len(self.proxies) - len(candidates)
+        if skipped:
+            logger.info(f"跳过 {skipped} 个近期失败的代理")
+
+        def safe_probe(proxy):
+            try:
+                return self.probe(proxy), None
+            except Exception as e:
+                return None, e
+
+        if candidates:
+            with ThreadPoolExecutor(max_workers=len(candidates)) as executor:
+                results = list(executor.map(safe_probe, candidates))
+            with self.lock:
+                for proxy, (latency, error) in zip(candidates, results):
+                    record = self.health.setdefault(proxy, {"ok": 0, "fail": 0})
+                    if latency is None:
+                        record["fail"] = record.get("fail", 0) + 1
+                        record["bad_until"] = now + PROXY_BAD_TTL
+                        record.pop("latency_ms", None)
+                        logger.warning(f"代理不可用: {proxy} ({error})")
+                    else:
+                        record["ok"] = record.get("ok", 0) + 1
+                        record["latency_ms"] = round(latency)
+                        record["bad_until"] = 0
+                        logger.info(f"代理 {proxy} 延迟 {latency:.0f}ms")
+        self.probed = True
+        self.save()
+
+    def is_healthy(self, proxy):
+        record = self.health.get(proxy, {})
+        return record.get("bad_until", 0) <= time.time() and record.get("latency_ms") is not None
+
+    def best(self, exclude=()):
+        """延迟最低的健康代理，没有时返回 None"""
+        healthy = [p for p in self.proxies if p not in exclude and self.is_healthy(p)]
+        return min(healthy, key=lambda p: self.health[p]["latency_ms"]) if healthy else None
+
+    def select(self, account=None, probe=True):
+        """为账号选择代理：优先沿用该账号上次的代理，否则选最快的健康代理
+
+        probe 为 False 时不探测，只按磁盘上的健康记录挑选，没有记录时用列表中的第一个。
+        """
+        if len(self.proxies) == 1:
+            return self.proxies[0]
+        if probe:
+            with self.probe_lock:
+                if not self.probed:
+                    self.probe_all()
+        with self.lock:
+            sticky = self.sticky.get(account) if account else None
+            if sticky in self.proxies and self.is_healthy(sticky):
+                return sticky
+            proxy = self.best()
+            if proxy is None:
+                if self.probed:
+                    logger.warning("没有可用的代理，使用列表中的第一个")
+                return self.proxies[0]
+            if account:
+                self.sticky[account] = proxy
+        self.save()
+        return proxy
+
+    def report(self, proxy, ok, elapsed_ms):
+        """记录一次经代理的请求结果"""
+        with self.lock:
+            recent = self.recent.setdefault(proxy, [])
+            recent.append((ok, elapsed_ms))
+            del recent[:-self.WINDOW]
+
+    def should_failover(self, proxy):
+        """最近的请求错误率或平均延迟超过阈值"""
+        if len(self.proxies) < 2:
+            return False
+        with self.lock:
+            recent = self.recent.get(proxy, [])
+            if len(recent) < self.MIN_SAMPLES:
+                return False
+            error_rate = sum(1 for ok, _ in recent if not ok) / len(recent)
+            avg_ms = sum(ms for _, ms in recent) / len(recent)
+        return error_rate >= PROXY_MAX_ERROR_RATE or avg_ms >= PROXY_MAX_LATENCY_MS
+
+    def failover(self, account, proxy):
+        """标记当前代理失败并切换到下一个最快的健康代理，没有可用代理时返回 None"""
+        with self.lock:
+            record = self.health.setdefault(proxy, {"ok": 0, "fail": 0})
+            record["fail"] = record.get("fail", 0) + 1
+            record["bad_until"] = time.time() + PROXY_BAD_TTL
+            self.recent.pop(proxy, None)
+            new_proxy = self.best(exclude=(proxy,))
+            if new_proxy and account:
+                self.sticky[account] = new_proxy
+        self.save()
+        return new_proxy
+
+
+_proxy_pool = None
+_proxy_pool_lock = threading.Lock()
+
+
+def get_proxy_pool():
+    """进程内共享的代理池，未配置代理时返回 None"""
+    global _proxy_pool
+    if not PROXY_LIST or CASSETTE_MODE == "replay":
+        return None
+    with _proxy_pool_lock:
+        if _proxy_pool is None:
+            _proxy_pool = ProxyPool(PROXY_LIST, os.path.join(DATA_DIR, "linuxdo_proxy_health.json"))
+        return _proxy_pool
+
+
+def notify_proxies():
+    """通知渠道使用的代理"""
+    pool = get_proxy_pool()
+    if not pool:
+        return None
+    proxy = pool.select()
+    return {"http": proxy, "https": proxy}
+
+
+async def notify_telegram(session, status_msg, proxies=None):
+    response = await session.post(
+        f"https://api.telegram.org/bot{TG_BOT_TOKEN}/sendMessage",
+        json={"chat_id": TG_CHAT_ID, "text": status_msg, "parse_mode": "HTML"},
+        proxies=proxies,
+    )
+    response.raise_for_status()
+
+
+async def notify_gotify(session, status_msg, proxies=None):
+    response = await session.post(
+        f"{GOTIFY_URL}/message",
+        params={"token": GOTIFY_TOKEN},
+        json={"title": "Linux.Do 升级任务", "message": status_msg, "priority": 5},
+        proxies=proxies,
+    )
+    response.raise_for_status()
+
+
+async def notify_sc3(session, status_msg, proxies=None):
+    uid = re.match(r"sct(\d+)t", SC3_PUSH_KEY, re.I).group(1)
+    response = await session.get(
+        f"https://{uid}.push.ft07.com/send/{SC3_PUSH_KEY}",
+        params={"title": "Linux.Do 升级任务", "desp": status_msg},
+        proxies=proxies,
+    )
+    response.raise_for_status()
+
+
+async def notify_wechat(session, status_msg, proxies=None):
+    # 自定义微信接口多为自建服务，不走代理
+    # 优先尝试 GET 请求
+    params = {"token": WECHAT_AUTH_TOKEN, "title": "Linux.Do 升级任务", "content": status_msg}
+    response = await session.get(WECHAT_API_URL, params=params)
+
+    # GET 失败 (405) 尝试 POST
+    if response.status_code == 405:
+        logger.debug("自定义微信 GET 返回 405, 尝试 POST")
+        response = await session.post(WECHAT_API_URL, json=params)
+
+    if response.status_code >= 400:
+        raise RuntimeError(f"HTTP {response.status_code}: {response.text[:100]}")
+
+
+def notification_channels():
+    """已配置的通知渠道"""
+    channels = {}
+    if TG_BOT_TOKEN and TG_CHAT_ID:
+        channels["Telegram"] = notify_telegram
+    if GOTIFY_URL and GOTIFY_TOKEN:
+        channels["Gotify"] = notify_gotify
+    if SC3_PUSH_KEY:
+        if re.match(r"sct(\d+)t", SC3_PUSH_KEY, re.I):
+            channels["Server 酱³"] = notify_sc3
+        else:
+            logger.warning("⚠️ SC3_PUSH_KEY 格式错误")
+    if WECHAT_API_URL and WECHAT_AUTH_TOKEN:
+        channels["自定义微信"] = notify_wechat
+    return channels
+
+
+def load_outbox():
+    """读取发件箱中未送达的消息"""
+    if not os.path.exists(NOTIFY_OUTBOX_FILE):
+        return []
+    try:
+        with open(NOTIFY_OUTBOX_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"读取通知发件箱失败: {e}")
+        return []
+
+
+def save_outbox(entries):
+    """写回发件箱（先写临时文件再替换，避免中途被杀导致文件损坏）"""
+    try:
+        if not entries:
+            if os.path.exists(NOTIFY_OUTBOX_FILE):
+                os.remove(NOTIFY_OUTBOX_FILE)
+            return
+        tmp_file = f"{NOTIFY_OUTBOX_FILE}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_file, NOTIFY_OUTBOX_FILE)
+    except Exception as e:
+        logger.warning(f"保存通知发件箱失败: {e}")
+
+
+async def deliver_all(channels, jobs, proxies=None):
+    """通过共享的连接池并发投递，返回每个任务的 (是否成功, 耗时, 错误)"""
+
+    async def deliver(send, session, message):
+        start = time.perf_counter()
+        try:
+            await send(session, message, proxies)
+            return True, time.perf_counter() - start, None
+        except Exception as e:
+            return False, time.perf_counter() - start, e
+
+    from curl_cffi.requests import AsyncSession
+
+    async with AsyncSession(impersonate=IMPERSONATE, timeout=10) as session:
+        cassette = get_cassette()
+        if cassette:
+            cassette.instrument_async_session(session)
+        return await asyncio.gather(*[deliver(channels[channel], session, message) for channel, message, _ in jobs])
+
+
+def push_notifications(status_msg, use_outbox=True):
+    """并发向所有已配置的渠道推送消息
+
+    发送失败的消息写入发件箱，之后的运行按指数退避重试；返回 {渠道: (是否成功, 耗时秒数)}。
+    """
+    channels = notification_channels()
+    now = time.time()
+    jobs = [(channel, status_msg, None) for channel in channels]
+    keep = []
+    for entry in load_outbox() if use_outbox else []:
+        if entry["channel"] not in channels:
+            continue
+        if entry["next_attempt"] <= now:
+            jobs.append((entry["channel"], entry["message"], entry))
+        else:
+            keep.append(entry)
+    if not jobs:
+        if use_outbox:
+            save_outbox(keep)
+        return {}
+
+    # 选代理可能要同步探测代理池，放在事件循环之外做一次，避免阻塞并发投递
+    results = asyncio.run(deliver_all(channels, jobs, notify_proxies()))
+
+    report = {}
+    for (channel, message, entry), (ok, elapsed, error) in zip(jobs, results):
+        label = channel if entry is None else f"{channel}(补发)"
+        if entry is None:
+            report[channel] = (ok, elapsed)
+        if ok:
+            logger.success(f"✅ {label} 通知发送成功")
+            continue
+        logger.warning(f"⚠️ {label} 通知发送失败: {error}")
+        if not use_outbox:
+            continue
+        attempts = (entry or {}).get("attempts", 0) + 1
+        if attempts >= NOTIFY_OUTBOX_MAX_ATTEMPTS:
+            logger.warning(f"⚠️ {label} 通知已重试 {attempts} 次，放弃")
+            continue
+        keep.append({
+            "channel": channel,
+            "message": message,
+            "attempts": attempts,
+            "created": (entry or {}).get("created", now),
+            "next_attempt": now + min(60 * 2 ** attempts, 6 * 3600),
+        })
+    if use_outbox:
+        save_outbox(keep)
+
+    if report:
+        logger.info("📨 通知耗时: " + ", ".join(f"{channel} {seconds:.2f}s" for channel, (_, seconds) in report.items()))
+    return report
+
+
+def parse_connect_table(html):
+    """解析 connect.linux.do 的升级要求表，返回 [[项目, 当前, 要求]]"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    rows = []
+    for row in soup.select("table tr"):
+        cells = row.select("td")
+        if len(cells) >= 3:
+            project = cells[0].text.strip()
+            current = cells[1].text.strip() if cells[1].text.strip() else "0"
+            requirement = cells[2].text.strip() if cells[2].text.strip() else "0"
+            rows.append([project, current, requirement])
+    return rows
+
+
+def requirement_gaps(rows):
+    """根据升级要求表计算各统计项距离达标还差多少"""
+    gaps = {}
+    for project, current, requirement in rows:
+        key = CONNECT_REQUIREMENTS.get(project.replace(" ", "").replace("(", "（").replace(")", "）"))
+        current_num = re.search(r"\d+(?:\.\d+)?", current)
+        required_num = re.search(r"\d+(?:\.\d+)?", requirement)
+        if not key or not current_num or not required_num:
+            continue
+        gap = max(0, math.ceil(float(required_num.group()) - float(current_num.group())))
+        gaps[key] = max(gaps.get(key, 0), gap)
+    return gaps
+
+
+class PacingScheduler:
+    """节奏调度器：所有动作都经过这里
+
+    - 按动作类型的令牌桶限速
+    - 遇到 429 / Retry-After / Discourse 限流错误时自动退避并放慢节奏，服务器健康时逐步加快
+    - 给定运行时间预算时，按已完成话题的平均耗时规划剩余工作，在截止前体面结束
+    """
+
+    # 令牌桶：PACING_SCALE 为 1 时每秒产生的令牌数、桶容量；产生速度随 PACING_SCALE 反向缩放，为 0 时不限速
+    # "类型:编号" 形式的动作（如并发浏览时每个标签页的 "topic:1"）各用一个独立的桶
+    BUCKETS = {
+        "topic": (1 / 5, 2),
+        "like": (1 / 3, 2),
+        "reply": (1 / 30, 1),
+        "request": (5, 10),
+    }
+    # 节奏系数范围：拟人延迟 = PACING_CONFIG 区间 × PACING_SCALE × 系数
+    MIN_FACTOR, MAX_FACTOR = 0.5, 4.0
+    # 单次冷却上限（秒）
+    MAX_COOLDOWN = 60
+    # 截止前预留给统计、通知和清理的时间（秒）
+    DEADLINE_RESERVE = 60
+    # 尚无实测数据时每个话题的预估耗时（秒）
+    DEFAULT_TOPIC_SECONDS = {"browser": 30, "http": 45}
+
+    def __init__(self, deadline_seconds: int = RUN_DEADLINE_SECONDS) -> None:
+        self.deadline = RUN_STARTED_AT + deadline_seconds if deadline_seconds > 0 else None
+        self.lock = threading.Lock()
+        self.factor = 1.0
+        self.cooldowns = {}
+        now = time.monotonic()
+        self.tokens = {kind: (burst, now) for kind, (_, burst) in self.BUCKETS.items()}
+        self.topic_durations = []
+
+    def time_left(self):
+        """距截止时间的剩余秒数，未设置截止时间时返回 None"""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic() - self.DEADLINE_RESERVE
+
+    def take(self, kind):
+        """取一个令牌（同时等待退避冷却），剩余时间不足时返回 False
+
+        PACING_SCALE 为 0 时跳过令牌桶，只遵守服务器限流带来的冷却。
+        """
+        base = kind.split(":")[0]
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                wait = max(self.cooldowns.get(kind, 0) - now, self.cooldowns.get(base, 0) - now, 0)
+                if PACING_SCALE <= 0:
+                    if wait == 0:
+                        return True
+                else:
+                    rate, burst = self.BUCKETS[base]
+                    rate /= PACING_SCALE
+                    tokens, last = self.tokens.setdefault(kind, (burst, now))
+                    tokens = min(burst, tokens + (now - last) * rate)
+                    if wait == 0 and tokens >= 1:
+                        self.tokens[kind] = (tokens - 1, now)
+                        return True
+                    self.tokens[kind] = (tokens, now)
+                    wait = max(wait, (1 - tokens) / rate if tokens < 1 else 0)
+            left = self.time_left()
+            if left is not None and wait > left:
+                return False
+            time.sleep(min(wait, 5))
+
+    def pace(self, delay_kind, bucket=None):
+        """拟人延迟（可选先取令牌），延迟会按当前节奏系数缩放并且不超过剩余时间"""
+        if bucket and not self.take(bucket):
+            return False
+        low, high = PACING_CONFIG[delay_kind]
+        delay = random.uniform(low, high) * PACING_SCALE * self.factor
+        left = self.time_left()
+        if left is not None:
+            delay = min(delay, max(left, 0))
+        time.sleep(delay)
+        return True
+
+    def dwell(self, seconds):
+        """停留一段阅读时间（按 PACING_SCALE 和节奏系数缩放，不超过剩余时间）"""
+        delay = seconds * PACING_SCALE * self.factor
+        left = self.time_left()
+        if left is not None:
+            delay = min(delay, max(left, 0))
+        time.sleep(delay)
+
+    def delay_ms(self, delay_kind):
+        """按当前节奏生成一次延迟（毫秒），供页面内脚本使用"""
+        low, high = PACING_CONFIG[delay_kind]
+        return int(random.uniform(low, high) * PACING_SCALE * self.factor * 1000)
+
+    def backoff(self, seconds, kind="request"):
+        """被限流：该类动作冷却指定时间，并整体放慢节奏"""
+        with self.lock:
+            self.cooldowns[kind] = max(self.cooldowns.get(kind, 0), time.monotonic() + seconds)
+            self.factor = min(self.MAX_FACTOR, self.factor * 2)
+        logger.info(f"触发限流，冷却 {seconds:.0f} 秒，节奏系数调整为 {self.factor:.2f}")
+
+    def on_response(self, resp):
+        """根据 HTTP 响应调整节奏"""
+        wait = rate_limit_wait(resp)
+        if wait is not None:
+            self.backoff(min(wait, self.MAX_COOLDOWN))
+        elif resp.status_code < 400:
+            with self.lock:
+                self.factor = max(self.MIN_FACTOR, self.factor * 0.97)
+
+    def record_topic(self, seconds):
+        """记录一个话题的实际耗时"""
+        with self.lock:
+            self.topic_durations.append(seconds)
+
+    def estimated_topic_seconds(self, engine="browser"):
+        with self.lock:
+            if self.topic_durations:
+                return sum(self.topic_durations) / len(self.topic_durations)
+        return self.DEFAULT_TOPIC_SECONDS.get(engine, 30)
+
+    def can_start_topic(self, engine="browser"):
+        """剩余时间是否够再浏览一个话题"""
+        left = self.time_left()
+        return left is None or left >= self.estimated_topic_seconds(engine)
+
+    def topic_budget(self, count, engine="browser", workers: int = 1):
+        """按剩余时间估算最多还能浏览几个话题"""
+        left = self.time_left()
+        if left is None:
+            return count
+        budget = max(int(left / self.estimated_topic_seconds(engine) * workers), 0)
+        if budget < count:
+            logger.warning(f"剩余时间 {left:.0f} 秒，计划浏览 {budget}/{count} 个话题")
+        return min(count, budget)
+
+
+class RequestBlocker:
+    """在网络层拦截图片、媒体、字体和第三方脚本，并统计拦截的请求数和字节数
+
+    按资源类型拦截在响应头阶段进行，此时可以从 Content-Length 得到被省下的字节数，响应体不会被下载；
+    按 URL 拦截的请求不会发出，只统计请求数。
+    """
+
+    def __init__(self, resource_types=BLOCK_RESOURCE_TYPES, url_patterns=BLOCK_URL_PATTERNS) -> None:
+        self.resource_types = [t.strip() for t in resource_types.split(",") if t.strip()]
+        self.url_patterns = [p.strip() for p in url_patterns.split(",") if p.strip()]
+        self.lock = threading.Lock()
+        self.blocked = {}
+        self.blocked_bytes = 0
+
+    def attach(self, page):
+        """为标签页启用拦截"""
+        try:
+            if self.resource_types:
+                add_cdp_callback(page, "Fetch.requestPaused", functools.partial(self.on_paused, page), immediate=True)
+                enable_fetch(page, [{"resourceType": t, "requestStage": "Response"} for t in self.resource_types])
+            if self.url_patterns:
+                add_cdp_callback(page, "Network.loadingFailed", self.on_failed)
+                page.run_cdp("Network.setBlockedURLs", urls=self.url_patterns)
+        except Exception as e:
+            logger.debug(f"启用请求拦截失败: {e}")
+
+    def count(self, kind, size=0):
+        with self.lock:
+            self.blocked[kind] = self.blocked.get(kind, 0) + 1
+            self.blocked_bytes += size
+
+    def on_paused(self, page, **kwargs):
+        # 请求阶段的暂停来自录像回放，由 Cassette 处理
+        if not is_response_stage(kwargs):
+            return
+        size = 0
+        for header in kwargs.get("responseHeaders") or []:
+            if header.get("name", "").lower() == "content-length":
                 try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    if attempt == retries - 1:
-                        logger.error(f"函数 {func.__name__} 最终执行失败: {str(e)}")
-                        raise
-                    logger.warning(f"函数 {func.__name__} 第 {attempt + 1}/{retries} 次尝试失败: {str(e)}")
-                    time.sleep(delay)
-            return None
-        return wrapper
-    return decorator
+                    size = int(header.get("value", 0))
+                except ValueError:
+                    pass
+        try:
+            page.run_cdp("Fetch.failRequest", requestId=kwargs["requestId"], errorReason="BlockedByClient")
+        except Exception:
+            return
+        self.count(kwargs.get("resourceType", "Other"), size)
 
+    def on_failed(self, **kwargs):
+        if kwargs.get("blockedReason") == "inspector":
+            self.count("URL")
 
-os.environ.pop("DISPLAY", None)
-os.environ.pop("DYLD_LIBRARY_PATH", None)
+    def summary(self):
+        """拦截统计摘要"""
+        total = sum(self.blocked.values())
+        detail = ", ".join(f"{kind} {count}" for kind, count in sorted(self.blocked.items()))
+        return f"拦截 {total} 个请求 / {self.blocked_bytes / 1024 / 1024:.2f}MB" + (f" ({detail})" if detail else "")
 
-USERNAME = os.environ.get("LINUXDO_USERNAME")
-PASSWORD = os.environ.get("LINUXDO_PASSWORD")
-BROWSE_ENABLED = os.environ.get("BROWSE_ENABLED", "true").strip().lower() not in ["false", "0", "off"]
 
-if not USERNAME:
-    USERNAME = os.environ.get("USERNAME")
-if not PASSWORD:
-    PASSWORD = os.environ.get("PASSWORD")
+def submit_in_context(executor, fn, *args):
+    """在当前 contextvars 上下文中提交任务（线程池线程默认不继承，多账号模式下日志的账号标记依赖它）"""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
 
-GOTIFY_URL = os.environ.get("GOTIFY_URL")
-GOTIFY_TOKEN = os.environ.get("GOTIFY_TOKEN")
-SC3_PUSH_KEY = os.environ.get("SC3_PUSH_KEY")
-TG_BOT_TOKEN = os.environ.get("TG_BOT_TOKEN")  # Telegram Bot Token
-TG_CHAT_ID = os.environ.get("TG_CHAT_ID")  # Telegram Chat ID
-WECHAT_API_URL = os.environ.get("WECHAT_API_URL")   # 自定义微信 API 地址
-WECHAT_AUTH_TOKEN = os.environ.get("WECHAT_AUTH_TOKEN") # 自定义微信 Token
-LINUXDO_PROXY = os.environ.get("LINUXDO_PROXY")  # 代理设置
 
-HOME_URL = "https://linux.do/"
-LOGIN_URL = "https://linux.do/login"
-SESSION_URL = "https://linux.do/session"
-CSRF_URL = "https://linux.do/session/csrf"
-COOKIE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "linuxdo_cookies.json")
+def add_cdp_callback(page, event, callback, immediate=False):
+    """为标签页追加 CDP 事件回调（DrissionPage 每个事件只保留一个回调，已有回调时串联调用）"""
+    handlers = page._driver.immediate_event_handlers if immediate else page._driver.event_handlers
+    previous = handlers.get(event)
+    if previous is None:
+        page._driver.set_callback(event, callback, immediate=immediate)
+        return
+
+    def chained(**kwargs):
+        # 一个回调出错不能让串在后面的回调（以及 DrissionPage 的事件线程）一起失效
+        for handler in (previous, callback):
+            try:
+                handler(**kwargs)
+            except Exception as e:
+                logger.debug(f"CDP 事件回调 {event} 失败: {e}")
+
+    page._driver.set_callback(event, chained, immediate=immediate)
 
 
-class LinuxDoUpgrade:
+def enable_fetch(page, patterns):
+    """为标签页追加 Fetch 拦截规则（Fetch.enable 会整体替换规则，这里与已有规则合并后再提交）"""
+    merged = list(getattr(page, "fetch_patterns", []))
+    merged += [pattern for pattern in patterns if pattern not in merged]
+    page.fetch_patterns = merged
+    page.run_cdp("Fetch.enable", patterns=merged)
+
+
+def is_response_stage(paused):
+    """Fetch.requestPaused 事件是否处于响应阶段（请求阶段没有响应状态码）"""
+    return "responseStatusCode" in paused or "responseErrorReason" in paused
+
+
+class NetworkCapture:
+    """记录 Discourse 前端自己请求的 JSON 接口（话题列表、话题帖子、当前用户）以及回复提交的结果
+
+    话题 ID、标题、帖子 ID、点赞状态和 highest_post_number 直接取自这些数据，不再额外请求接口，
+    也不必逐个元素读取 DOM。整页加载时 Discourse 不发 XHR，而是把同样的 JSON 预加载在
+    #data-preloaded 上，由 harvest_preloaded 一次读取。
+    """
+
+    URL_PATTERNS = (
+        ("topic_list", re.compile(r"/(?:latest|unread|new|top|hot)\.json$")),
+        ("posts", re.compile(r"^/t/(\d+)/posts\.json$")),
+        ("topic", re.compile(r"^/t/(?:[^/]+/)?(\d+)(?:/\d+)?\.json$")),
+        ("current_user", re.compile(r"^/session/current\.json$")),
+    )
+    REPLY_PATTERN = re.compile(r"^/posts(?:\.json)?$")
+
+    PRELOADED_JS = "const e = document.getElementById('data-preloaded'); return e ? e.dataset.preloaded : null;"
+
     def __init__(self) -> None:
-        from sys import platform
-
-        if platform == "linux" or platform == "linux2":
-            platformIdentifier = "X11; Linux x86_64"
-        elif platform == "darwin":
-            platformIdentifier = "Macintosh; Intel Mac OS X 10_15_7"
-        elif platform == "win32":
-            platformIdentifier = "Windows NT 10.0; Win64; x64"
-
-        co = (
-            ChromiumOptions()
-            .headless(True)
-            .incognito(True)
-            .set_argument("--no-sandbox")
-            .set_argument("--disable-gpu")
-            .set_argument("--disable-dev-shm-usage")
-            .set_argument("--disable-extensions")
-            .set_argument("--window-size=1920,1080")
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.topic_list = []
+        self.topics = {}
+        self.posts = {}
+        self.current_user = None
+        self.responses = 0
+        self.bytes = 0
+        self.replies = {}  # 标签页 -> 回复提交（POST /posts）响应的状态码，按到达顺序
+
+    def attach(self, page):
+        """为标签页注册 JSON 响应记录（与其他网络事件回调串联）"""
+        try:
+            add_cdp_callback(page, "Network.responseReceived", functools.partial(self.on_response, page))
+            add_cdp_callback(page, "Network.loadingFinished", functools.partial(self.on_finished, page))
+            page.run_cdp("Network.enable")
+        except Exception as e:
+            logger.debug(f"注册接口数据记录失败: {e}")
+
+    @classmethod
+    def classify(cls, url):
+        """按 URL 判断接口类型，非站点 JSON 接口返回 None"""
+        parsed = urlparse(url)
+        if parsed.hostname != SITE_HOST:
+            return None
+        for kind, pattern in cls.URL_PATTERNS:
+            if pattern.search(parsed.path):
+                return kind
+        return None
+
+    def on_response(self, page, **kwargs):
+        response = kwargs.get("response", {})
+        if kwargs.get("type") not in ("XHR", "Fetch"):
+            return
+        parsed = urlparse(response.get("url", ""))
+        if parsed.hostname == SITE_HOST and self.REPLY_PATTERN.search(parsed.path):
+            with self.lock:
+                self.replies.setdefault(page.tab_id, []).append(response.get("status"))
+            return
+        if response.get("status") != 200:
+            return
+        kind = self.classify(response.get("url", ""))
+        if kind:
+            with self.lock:
+                self.pending[kwargs.get("requestId")] = kind
+
+    def on_finished(self, page, **kwargs):
+        with self.lock:
+            kind = self.pending.pop(kwargs.get("requestId"), None)
+        if not kind:
+            return
+        try:
+            result = page.run_cdp("Network.getResponseBody", requestId=kwargs["requestId"])
+            body = result.get("body", "")
+            if result.get("base64Encoded"):
+                import base64
+
+                body = base64.b64decode(body).decode("utf-8")
+            self.ingest(kind, json.loads(body), len(body))
+        except Exception as e:
+            logger.debug(f"读取接口响应失败: {e}")
+
+    def reply_mark(self, page):
+        """标签页上已记录的回复提交响应数，点击提交前取一次，交给 wait_reply"""
+        with self.lock:
+            return len(self.replies.get(page.tab_id, []))
+
+    def wait_reply(self, page, mark, timeout=10):
+        """等待 mark 之后的第一个回复提交响应，返回状态码，超时返回 None"""
+
+        def status():
+            with self.lock:
+                statuses = self.replies.get(page.tab_id, [])
+                return statuses[mark] if len(statuses) > mark else None
+
+        wait_until(status, timeout)
+        return status()
+
+    def harvest_preloaded(self, page):
+        """读取整页加载时 Discourse 预加载的 JSON（一次 CDP 调用），没有预加载数据时返回 False"""
+        try:
+            raw = page.run_js(self.PRELOADED_JS)
+            if not raw:
+                return False
+            store = json.loads(raw)
+        except Exception as e:
+            logger.debug(f"读取预加载数据失败: {e}")
+            return False
+        for key, value in store.items():
+            if key.startswith("topic_list"):
+                kind = "topic_list"
+            elif re.fullmatch(r"topic_\d+", key):
+                kind = "topic"
+            elif key == "currentUser":
+                kind = "current_user"
+            else:
+                continue
+            try:
+                data = json.loads(value) if isinstance(value, str) else value
+            except ValueError:
+                continue
+            if kind == "current_user":
+                data = {"current_user": data}
+            self.ingest(kind, data, len(value) if isinstance(value, str) else 0)
+        return True
+
+    def ingest(self, kind, data, size=0):
+        """记录一份接口数据"""
+        with self.lock:
+            self.responses += 1
+            self.bytes += size
+            if kind == "topic_list":
+                topics = (data.get("topic_list") or {}).get("topics") or []
+                if topics:
+                    self.topic_list = topics
+            elif kind == "topic" and data.get("id"):
+                posts = (data.get("post_stream") or {}).get("posts") or []
+                self.topics[data["id"]] = {k: v for k, v in data.items() if k != "post_stream"}
+                self.add_posts(data["id"], posts)
+            elif kind == "posts":
+                for post in (data.get("post_stream") or {}).get("posts") or []:
+                    if post.get("topic_id"):
+                        self.add_posts(post["topic_id"], [post])
+            elif kind == "current_user" and data.get("current_user"):
+                self.current_user = data["current_user"]
+
+    def add_posts(self, topic_id, posts):
+        store = self.posts.setdefault(topic_id, {})
+        for post in posts:
+            if post.get("id"):
+                store[post["id"]] = post
+
+    def topic_entries(self):
+        """最近一次话题列表中的 [(url, 标题)]，置顶话题排除在外"""
+        with self.lock:
+            topics = list(self.topic_list)
+        return [
+            (f"{HOME_URL}t/{t.get('slug') or 'topic'}/{t['id']}", t.get("title", ""))
+            for t in topics
+            if t.get("id") and not t.get("pinned")
+        ]
+
+    def topic(self, topic_id):
+        """话题元数据（不含帖子），未捕获时返回 None"""
+        with self.lock:
+            return self.topics.get(topic_id)
+
+    def posts_for(self, topic_id):
+        """话题中已加载的帖子，未捕获时返回 None"""
+        with self.lock:
+            store = self.posts.get(topic_id)
+            return sorted(store.values(), key=lambda p: p.get("post_number", 0)) if store else None
+
+    def mark_liked(self, topic_id, post_id):
+        """页面上点赞成功后更新本地记录，避免同一帖子被再次选中"""
+        with self.lock:
+            post = self.posts.get(topic_id, {}).get(post_id)
+            if post is not None:
+                post["current_user_reaction"] = post.get("current_user_reaction") or {"id": "heart"}
+
+    def summary(self):
+        """接口数据记录摘要"""
+        return f"接口数据 {self.responses} 份 / {self.bytes / 1024:.0f}KB"
+
+
+class TopicIndex:
+    """本地话题索引（SQLite，每个账号一个文件）
+
+    记录话题的帖子数、已读到的楼层和最近访问时间，用于优先挑选未读帖子多、单位浏览时间收益高的话题。
+    """
+
+    # 单次访问能读到的帖子数上限、固定开销（秒）、每帖阅读耗时（秒）
+    ENGINE_COST = {
+        "browser": (10, 10, 3),
+        "http": (20, 2, 0.5),
+    }
+
+    def __init__(self, path) -> None:
+        import sqlite3
+
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS topics (
+                id INTEGER PRIMARY KEY,
+                title TEXT,
+                slug TEXT,
+                posts_count INTEGER DEFAULT 0,
+                highest_post_number INTEGER DEFAULT 0,
+                last_read_post_number INTEGER DEFAULT 0,
+                last_visit REAL,
+                updated_at REAL
+            )
+            """
         )
-        if LINUXDO_PROXY:
-            co.set_proxy(LINUXDO_PROXY)
-        co.set_user_agent(
-            f"Mozilla/5.0 ({platformIdentifier}) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36"
+        self.conn.commit()
+
+    def update(self, topics):
+        """用话题列表接口返回的数据更新索引"""
+        now = time.time()
+        with self.lock:
+            for t in topics:
+                self.conn.execute(
+                    """
+                    INSERT INTO topics (id, title, slug, posts_count, highest_post_number, last_read_post_number, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(id) DO UPDATE SET
+                        title = excluded.title,
+                        slug = excluded.slug,
+                        posts_count = excluded.posts_count,
+                        highest_post_number = excluded.highest_post_number,
+                        last_read_post_number = MAX(topics.last_read_post_number, excluded.last_read_post_number),
+                        updated_at = excluded.updated_at
+                    """,
+                    (
+                        t["id"],
+                        t.get("title", ""),
+                        t.get("slug", "topic"),
+                        t.get("posts_count", 0),
+                        t.get("highest_post_number") or t.get("posts_count", 0),
+                        t.get("last_read_post_number") or 0,
+                        now,
+                    ),
+                )
+            self.conn.commit()
+
+    def mark_read(self, topic_id, post_number):
+        """记录已读到的楼层"""
+        with self.lock:
+            self.conn.execute(
+                """
+                INSERT INTO topics (id, last_read_post_number, last_visit) VALUES (?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    last_read_post_number = MAX(topics.last_read_post_number, excluded.last_read_post_number),
+                    last_visit = excluded.last_visit
+                """,
+                (topic_id, post_number, time.time()),
+            )
+            self.conn.commit()
+
+    def rank(self, topic_ids, count, engine="browser"):
+        """按“每秒浏览可获得的未读帖子数”从高到低挑选话题，跳过没有未读帖子的话题"""
+        if not topic_ids:
+            return []
+        per_visit, overhead, per_post = self.ENGINE_COST.get(engine, self.ENGINE_COST["browser"])
+        placeholders = ",".join("?" * len(topic_ids))
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT id, title, slug, highest_post_number, last_read_post_number FROM topics WHERE id IN ({placeholders})",
+                list(topic_ids),
+            ).fetchall()
+
+        scored = []
+        for topic_id, title, slug, highest, last_read in rows:
+            unread = min(max((highest or 0) - (last_read or 0), 0), per_visit)
+            if unread <= 0:
+                continue
+            score = unread / (overhead + unread * per_post)
+            # 加一点随机扰动，避免每次都选同一批
+            scored.append((score * random.uniform(0.9, 1.1), {"id": topic_id, "title": title or "", "slug": slug or "topic"}))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [topic for _, topic in scored[:count]]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def topic_id_from_url(url):
+    """从话题 URL 中解析话题 ID"""
+    match = re.search(r"/t/[^/]+/(\d+)", url or "")
+    return int(match.group(1)) if match else None
+
+
+class ActionJournal:
+    """只追加的动作日志（JSON Lines，每个账号一个文件）
+
+    每完成一个动作（读完话题、点赞、回复）立即追加一行并落盘，运行中途被杀也不会丢失；
+    按天汇总得到当天的额度账本，后续运行据此跳过已完成的工作并分摊每日预算。
+    """
+
+    KIND_TARGETS = {"topic": "topics_to_browse", "like": "likes_to_give", "reply": "replies_to_post"}
+    KEEP_DAYS = 7
+
+    def __init__(self, path) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self.reset(time.strftime("%Y-%m-%d"))
+        self.load()
+
+    def reset(self, day):
+        """切换到新的一天，清空当天账本"""
+        self.day = day
+        self.used = {target: 0 for target in self.KIND_TARGETS.values()}
+        self.topics = set()  # 当天已读完的话题
+        self.posts = set()  # 当天已点赞的帖子
+
+    def roll_day(self):
+        """运行跨过零点时换用新一天的账本"""
+        today = time.strftime("%Y-%m-%d")
+        if today != self.day:
+            self.reset(today)
+
+    def load(self):
+        """读取日志并汇总当天账本，顺带清理过期记录"""
+        if not os.path.exists(self.path):
+            return
+        oldest_day = time.strftime("%Y-%m-%d", time.localtime(time.time() - self.KEEP_DAYS * 86400))
+        kept, dirty = [], False
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # 写入中途被杀留下的半行，必须重写文件，否则下一次追加会接在半行后面
+                    dirty = True
+                    continue
+                if entry.get("day", "") < oldest_day:
+                    dirty = True
+                    continue
+                if not line.endswith("\n"):
+                    dirty = True
+                    line += "\n"
+                kept.append(line)
+                if entry.get("day") == self.day:
+                    self.apply(entry)
+        if dirty:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.writelines(kept)
+            os.replace(tmp_path, self.path)
+
+    def apply(self, entry):
+        target = self.KIND_TARGETS.get(entry.get("kind"))
+        if not target:
+            return
+        self.used[target] += 1
+        if entry["kind"] == "topic" and entry.get("topic_id"):
+            self.topics.add(entry["topic_id"])
+        if entry["kind"] == "like" and entry.get("post_id"):
+            self.posts.add(entry["post_id"])
+
+    def record(self, kind, topic_id=None, post_id=None):
+        """追加一条已完成的动作并立即 fsync"""
+        with self.lock:
+            self.roll_day()
+            entry = {"ts": int(time.time()), "day": self.day, "kind": kind}
+            if topic_id:
+                entry["topic_id"] = topic_id
+            if post_id:
+                entry["post_id"] = post_id
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.apply(entry)
+
+    def used_today(self):
+        """当天各项已用额度的快照"""
+        with self.lock:
+            self.roll_day()
+            return dict(self.used)
+
+    def daily_share(self, target):
+        """本次运行可用的额度：当天剩余预算按剩余运行次数平均分摊"""
+        with self.lock:
+            self.roll_day()
+            remaining = max(0, DAILY_BUDGET[target] - self.used[target])
+        now = time.localtime()
+        seconds_left = 86400 - (now.tm_hour * 3600 + now.tm_min * 60 + now.tm_sec)
+        runs_left = max(1, math.ceil(seconds_left / (86400 / max(RUNS_PER_DAY, 1))))
+        return math.ceil(remaining / runs_left)
+
+
+class ActionQueue:
+    """HTTP 写操作队列：点赞和回复先按本次目标占用配额再入队，批量提交时遵守服务器限流"""
+
+    MAX_RATE_LIMIT_WAIT = 60  # 单次限流等待上限（秒），超过则放弃该类操作
+    KIND_NAMES = {"like": "点赞", "reply": "回复"}
+
+    def __init__(self, app) -> None:
+        self.app = app
+        self.lock = threading.Lock()
+        self.pending = []
+        # 被限流且等待时间过长的操作类型，本次运行不再提交
+        self.blocked_kinds = set()
+        self.use_reactions = True
+
+    def like(self, post_id):
+        """点赞入队，配额已满时返回 False"""
+        if "like" in self.blocked_kinds:
+            return False
+        if not self.app.reserve_quota('likes_given', self.app.targets['likes_to_give']):
+            return False
+        with self.lock:
+            self.pending.append(("like", {"post_id": post_id}))
+        return True
+
+    def reply(self, topic_id, raw):
+        """回复入队，配额已满时返回 False"""
+        if "reply" in self.blocked_kinds:
+            return False
+        if not self.app.reserve_quota('replies_posted', self.app.targets['replies_to_post']):
+            return False
+        with self.lock:
+            self.pending.append(("reply", {"topic_id": topic_id, "raw": raw}))
+        return True
+
+    def flush(self):
+        """提交队列中的全部操作，返回成功数"""
+        with self.lock:
+            actions, self.pending = self.pending, []
+        done = 0
+        for i, (kind, payload) in enumerate(actions):
+            stat = 'likes_given' if kind == "like" else 'replies_posted'
+            ok = False
+            if kind not in self.blocked_kinds:
+                try:
+                    with self.app.telemetry.span(kind):
+                        ok = self.submit(kind, payload)
+                except Exception as e:
+                    logger.debug(f"提交{self.KIND_NAMES[kind]}失败: {e}")
+            if not ok:
+                self.app.release_quota(stat)
+                continue
+            done += 1
+            if kind == "like":
+                self.app.journal_record("like", post_id=payload["post_id"])
+                logger.success(f"👍 点赞成功 (帖子 {payload['post_id']})")
+            else:
+                self.app.journal_record("reply", topic_id=payload["topic_id"])
+                logger.success(f"💬 回复成功: {payload['raw']}")
+            if i < len(actions) - 1:
+                self.app.scheduler.pace("after_like" if kind == "like" else "after_reply")
+        return done
+
+    def submit(self, kind, payload):
+        """提交单个操作，处理限流和 CSRF 失效"""
+        for _ in range(3):
+            resp = self.send(kind, payload)
+            if resp.status_code == 404 and kind == "like" and self.use_reactions:
+                # 站点未安装 discourse-reactions，改用标准点赞接口
+                self.use_reactions = False
+                continue
+            wait = rate_limit_wait(resp)
+            if wait is not None:
+                if wait > self.MAX_RATE_LIMIT_WAIT:
+                    logger.warning(f"{self.KIND_NAMES[kind]}被限流 {wait:.0f} 秒，本次运行不再提交")
+                    self.blocked_kinds.add(kind)
+                    return False
+                # 调度器已根据响应进入冷却，下次 send 取令牌时等待
+                continue
+            if resp.status_code == 403 and "BAD CSRF" in resp.text:
+                self.app.get_csrf_token(refresh=True)
+                continue
+            if resp.status_code >= 400:
+                logger.debug(f"{self.KIND_NAMES[kind]} HTTP {resp.status_code}: {resp.text[:200]}")
+                return False
+            return True
+        return False
+
+    def send(self, kind, payload):
+        if not self.app.scheduler.take(kind):
+            raise TimeoutError("剩余时间不足")
+        if kind == "reply":
+            return self.app.api_post("posts.json", data={"topic_id": payload["topic_id"], "raw": payload["raw"]})
+        if self.use_reactions:
+            return self.app.api_put(
+                f"discourse-reactions/posts/{payload['post_id']}/custom-reactions/heart/toggle.json"
+            )
+        return self.app.api_post(
+            "post_actions", data={"id": payload["post_id"], "post_action_type_id": 2, "flag_topic": "false"}
         )
-        self.browser = Chromium(co)
-        self.page = self.browser.new_tab()
-        # 使用 eager 模式，DOM 加载完即可，不用等待所有资源 loaded
-        self.page.set.load_mode.eager()
-        self.session = requests.Session()
-        if LINUXDO_PROXY:
-            self.session.proxies = {"http": LINUXDO_PROXY, "https": LINUXDO_PROXY}
-            logger.info(f"已启用代理: {LINUXDO_PROXY}")
-        self.session.headers.update(
-            {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/142.0.0.0 Safari/537.36 Edg/142.0.0.0",
-                "Accept": "application/json, text/javascript, */*; q=0.01",
-                "Accept-Language": "zh-CN,zh;q=0.9",
+
+
+class MemoryGovernor:
+    """浏览器内存守护：后台定时采样进程树 RSS，超出预算时标记，由浏览流程在话题间隙重启浏览器"""
+
+    def __init__(self, app, budget_mb: int = BROWSER_RSS_BUDGET_MB, interval: float = MEMORY_SAMPLE_INTERVAL) -> None:
+        self.app = app
+        self.budget = budget_mb * 1024 * 1024
+        self.interval = interval
+        self.over_budget = False
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if import_psutil() is None:
+            if self.budget:
+                logger.warning("未安装 psutil，无法采样浏览器内存，内存预算不生效")
+            return
+        self.stopped.clear()
+        # 沿用当前上下文，多账号模式下采样线程的日志也带账号标记
+        self.thread = threading.Thread(target=contextvars.copy_context().run, args=(self.loop,), daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=self.interval + 1)
+        self.thread = None
+
+    def loop(self):
+        while not self.stopped.wait(self.interval):
+            rss = self.app.sample_rss()
+            if self.budget and rss > self.budget and not self.over_budget:
+                # 并发浏览时多个标签页共用浏览器，话题间隙没有安全的重启时机，只做采样
+                action = "并发浏览时不重启" if BROWSE_CONCURRENCY > 1 else "将在话题间隙重启"
+                logger.warning(
+                    f"浏览器内存 {rss / 1024 / 1024:.0f}MB 超出预算 {self.budget / 1024 / 1024:.0f}MB，{action}"
+                )
+                self.over_budget = True
+
+
+class TabPool:
+    """话题标签页池：复用已启动 Discourse 应用的标签页，通过前端路由切换话题"""
+
+    # Discourse 前端路由跳转：依次尝试全局 DiscourseURL、AMD 模块和 Ember 路由，都不可用时返回 false
+    # 由调用方回退到整页加载
+    ROUTE_JS = """
+        const url = arguments[0];
+        try {
+            let DiscourseURL = window.DiscourseURL;
+            if (!DiscourseURL && typeof require === 'function') {
+                try { DiscourseURL = require('discourse/lib/url').default; } catch (e) {}
             }
-        )
-        
+            if (DiscourseURL && DiscourseURL.routeTo) {
+                DiscourseURL.routeTo(url);
+                return true;
+            }
+            const container = window.Discourse && window.Discourse.__container__;
+            const router = container && container.lookup('router:main');
+            if (router) {
+                router.transitionTo(url);
+                return true;
+            }
+        } catch (e) {}
+        return false;
+    """
+
+    def __init__(self, app, max_uses: int = TAB_POOL_MAX_USES, max_heap_mb: int = TAB_POOL_MAX_HEAP_MB) -> None:
+        self.app = app
+        self.max_uses = max_uses
+        self.max_heap_mb = max_heap_mb
+        self.idle = []
+        self.uses = {}
+        self.lock = threading.Lock()
+        self.routed = 0  # 通过前端路由打开的话题数
+        self.reloaded = 0  # 复用标签页但回退到整页加载的话题数
+
+    def acquire(self, topic_url):
+        """取出一个标签页并打开话题"""
+        with self.lock:
+            page = self.idle.pop() if self.idle else None
+
+        if page is not None:
+            try:
+                path = re.sub(r"^https?://[^/]+", "", topic_url)
+                # 跳转后旧话题的 .topic-post 仍在 DOM 中，要等新话题自己的帖子渲染出来
+                ready = f'#topic[data-topic-id="{topic_id_from_url(topic_url)}"] .topic-post'
+                if (
+                    page.run_js(self.ROUTE_JS, path)
+                    and page.wait.url_change(path, timeout=10)
+                    and wait_for_selector(page, ready, timeout=10)
+                ):
+                    self.count_use(page, routed=True)
+                    return page
+                if self.count_use(page, routed=False) == 1:
+                    logger.info("前端路由跳转失败，复用的标签页改为整页加载话题")
+                self.app.navigate(page, topic_url)
+                return page
+            except Exception as e:
+                logger.debug(f"复用标签页失败: {e}")
+                self.discard(page)
+
+        page = self.app.new_tab()
+        try:
+            self.app.navigate(page, topic_url)
+        except Exception:
+            page.close()
+            raise
+        with self.lock:
+            self.uses[page.tab_id] = 1
+        return page
+
+    def count_use(self, page, routed):
+        """记一次复用，返回同一方式（路由/整页）累计的次数"""
+        with self.lock:
+            self.uses[page.tab_id] = self.uses.get(page.tab_id, 0) + 1
+            if routed:
+                self.routed += 1
+                return self.routed
+            self.reloaded += 1
+            return self.reloaded
+
+    def release(self, page):
+        """归还标签页，超过复用次数或内存过大时回收"""
+        with self.lock:
+            uses = self.uses.get(page.tab_id, 0)
+        if uses >= self.max_uses:
+            logger.debug(f"标签页已复用 {self.max_uses} 次，回收")
+            self.discard(page)
+            return
+        try:
+            heap = page.run_js("return performance.memory ? performance.memory.usedJSHeapSize : 0") or 0
+        except Exception:
+            self.discard(page)
+            return
+        if heap > self.max_heap_mb * 1024 * 1024:
+            logger.debug(f"标签页 JS 堆 {heap / 1024 / 1024:.0f}MB 超出上限，回收")
+            self.discard(page)
+            return
+        with self.lock:
+            self.idle.append(page)
+
+    def discard(self, page):
+        """关闭并丢弃标签页"""
+        with self.lock:
+            self.uses.pop(page.tab_id, None)
+        try:
+            page.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """关闭池中所有标签页"""
+        with self.lock:
+            pages, self.idle = self.idle, []
+        for page in pages:
+            self.discard(page)
+
+
+class LinuxDoUpgrade:
+    def __init__(self, username=None, password=None, proxy=None, shared_browser=None, probe_proxies=True) -> None:
+        """
+        :param shared_browser: 多账号模式下返回共享 Chromium 的函数，为空时独占一个浏览器
+        :param probe_proxies: 为 False 时不探测代理池，直接沿用磁盘上记录的代理（用于需要很快返回的子命令）
+        """
+        self.username = username or USERNAME
+        self.password = password or PASSWORD
+        # 账号文件中指定的代理优先，否则在首次创建会话或浏览器时从代理池中挑选（见 proxy 属性）
+        self.proxy_pool = None if proxy is not None else get_proxy_pool()
+        self.probe_proxies = probe_proxies
+        self._proxy = proxy
+        self.proxy_selected = proxy is not None or self.proxy_pool is None
+        # 代理切换后浏览器需要重启才能生效
+        self.browser_stale = False
+        self.browser_proxy = None
+
+        # 浏览器延迟启动：HTTP 登录和 HTTP 引擎不需要浏览器
+        self._browser = None
+        self._page = None
+        self.shared_browser = shared_browser
+        self.owns_browser = shared_browser is None
+        self.context_id = None
+        self.cookie_file = COOKIE_FILE if shared_browser is None else cookie_file_for(self.username)
+        self.profile_lock = None
+        self.memory = MemoryGovernor(self)
+        self.traffic = TrafficMeter()
+        self.capture = NetworkCapture()
+        self.blocker = RequestBlocker() if BLOCKING_ENABLED else None
+        self._session = None
+        self.csrf_token = None
+        self.cassette = get_cassette()
+        self.telemetry = Telemetry()
+        self.recorder = FlightRecorder()
+
         # 统计数据
         self.stats = {
             'topics_browsed': 0,
@@ -133,24 +2534,285 @@ class LinuxDoUpgrade:
             'likes_given': 0,
             'replies_posted': 0,
         }
+        # 本次运行的目标，默认取 UPGRADE_CONFIG，plan_run 会按升级要求的差距下调
+        self.targets = dict(UPGRADE_CONFIG)
+        # 各统计项距离达标的差距，None 表示未获取到升级要求
+        self.gaps = None
+        self.lock = threading.RLock()
+        self.tab_pool = TabPool(self) if TAB_POOL_ENABLED else None
+        self.actions = ActionQueue(self)
+        self.scheduler = PacingScheduler()
+        self._topic_index = None
+        self.journal = None
+        if JOURNAL_ENABLED:
+            self.journal = ActionJournal(
+                os.path.join(DATA_DIR, f"linuxdo_journal_{safe_account_name(self.username)}.jsonl")
+            )
+        # 每个话题从打开到可浏览的耗时（秒），用于对比标签页池前后的延迟
+        self.topic_latencies = []
+
+    @property
+    def proxy(self):
+        """本账号使用的代理，首次用到时才从代理池选择（代理池可能要探测所有代理）"""
+        if not self.proxy_selected:
+            self._proxy = self.proxy_pool.select(self.username, probe=self.probe_proxies)
+            self.proxy_selected = True
+        return self._proxy
+
+    @proxy.setter
+    def proxy(self, value):
+        self._proxy = value
+        self.proxy_selected = True
+
+    @property
+    def session(self):
+        """HTTP 会话，首次使用时创建"""
+        if self._session is None:
+            from curl_cffi import requests
+
+            session = requests.Session()
+            if self.proxy:
+                session.proxies = {"http": self.proxy, "https": self.proxy}
+                logger.info(f"已启用代理: {self.proxy}")
+            session.headers.update(
+                {
+                    "User-Agent": user_agent(),
+                    "Accept": "application/json, text/javascript, */*; q=0.01",
+                    "Accept-Language": "zh-CN,zh;q=0.9",
+                    **client_hint_headers(),
+                }
+            )
+            if self.cassette:
+                self.cassette.instrument_session(session)
+            self.telemetry.instrument_session(session)
+            self.recorder.instrument_session(session)
+            self._session = session
+        return self._session
+
+    @property
+    def topic_index(self):
+        """话题索引（首次访问时打开，未启用时为 None）"""
+        if self._topic_index is None and TOPIC_INDEX_ENABLED:
+            os.makedirs(TOPIC_INDEX_DIR, exist_ok=True)
+            self._topic_index = TopicIndex(
+                os.path.join(TOPIC_INDEX_DIR, f"linuxdo_topics_{safe_account_name(self.username)}.db")
+            )
+        return self._topic_index
+
+    @property
+    def browser(self):
+        """浏览器（首次访问时启动）"""
+        if self._browser is None:
+            self.start_browser()
+        return self._browser
+
+    @property
+    def page(self):
+        """主标签页（首次访问时启动浏览器）"""
+        if self._page is None:
+            self.start_browser()
+        return self._page
+
+    def start_browser(self):
+        """启动浏览器并注入 Session 中的 Cookie"""
+        with self.lock:
+            if self._page is not None:
+                return
+            # 浏览器实际使用的出口；代理切换后到重启前可能与 self.proxy 不同
+            self.browser_proxy = self.proxy
+            if self.shared_browser is None:
+                # 单账号模式：独占一个浏览器
+                profile_dir = None
+                if BROWSER_PROFILE_DIR:
+                    profile_dir, self.profile_lock = prepare_profile(self.username)
+                logger.info("启动浏览器...")
+                from DrissionPage import Chromium
+
+                self._browser = Chromium(build_chromium_options(self.proxy, profile_dir))
+                self.memory.start()
+            else:
+                # 多账号模式：共享浏览器，每个账号一个独立的 BrowserContext（独立 Cookie 罐和代理），
+                # 浏览器与 Session 走同一出口，cf_clearance 和 Cookie 才对两者都有效
+                self._browser = self.shared_browser()
+                context_args = {"proxyServer": self.proxy} if self.proxy else {}
+                self.context_id = self._browser._run_cdp(
+                    "Target.createBrowserContext", **context_args
+                )["browserContextId"]
+            self._page = self.new_tab()
+            # 使用 eager 模式，DOM 加载完即可，不用等待所有资源 loaded
+            self._page.set.load_mode.eager()
+            cookies = self.session_cookie_list()
+            if cookies:
+                self._page.set.cookies(cookies)
+
+    def incr_stat(self, key, count=1):
+        """线程安全地累加统计"""
+        with self.lock:
+            self.stats[key] += count
+
+    def reserve_quota(self, key, limit):
+        """线程安全地占用一次配额，配额已满时返回 False"""
+        with self.lock:
+            if self.stats[key] >= limit:
+                return False
+            self.stats[key] += 1
+            return True
+
+    def release_quota(self, key):
+        """动作未成功时归还配额"""
+        with self.lock:
+            self.stats[key] -= 1
+
+    def journal_record(self, kind, topic_id=None, post_id=None):
+        """把已完成的动作写入动作日志"""
+        if not self.journal:
+            return
+        try:
+            self.journal.record(kind, topic_id=topic_id, post_id=post_id)
+        except Exception as e:
+            logger.debug(f"写入动作日志失败: {e}")
+
+    def apply_daily_budget(self):
+        """按动作日志中的当天账本下调本次目标，当天额度全部用完时返回 False"""
+        if not self.journal:
+            return True
+        used = self.journal.used_today()
+        logger.info(
+            f"📒 今日已完成: 话题 {used['topics_to_browse']} / 点赞 {used['likes_to_give']} / 回复 {used['replies_to_post']}"
+        )
+        for target in self.targets:
+            self.targets[target] = min(self.targets[target], self.journal.daily_share(target))
+        logger.info(
+            f"本次分摊额度: 话题 {self.targets['topics_to_browse']} / 点赞 {self.targets['likes_to_give']} / "
+            f"回复 {self.targets['replies_to_post']}"
+        )
+        return self.targets["topics_to_browse"] > 0
+
+    def sample_rss(self):
+        """采样浏览器内存，返回进程树 RSS（字节）"""
+        browser = self._browser
+        if browser is None:
+            return 0
+        return self.telemetry.sample_rss(browser.process_id)
+
+    def recycle_browser_if_needed(self):
+        """浏览器内存超出预算或代理已切换时保存 Cookie 并重启浏览器，下次访问页面时自动重新启动
+
+        共享浏览器只在代理切换时重建本账号的上下文（新上下文使用新代理），内存预算只对独占的浏览器生效。
+        """
+        if self._browser is None or not (self.browser_stale or (self.memory.over_budget and self.owns_browser)):
+            return False
+        logger.info("♻️ 重启浏览器以切换代理" if self.browser_stale else "♻️ 重启浏览器以释放内存")
+        self.sync_cookies_to_session()
+        self.save_cookies()
+        self.close_browser()
+        self.memory.over_budget = False
+        self.browser_stale = False
+        self.telemetry.count("browser_restarts")
+        return True
+
+    def report_proxy(self, ok, elapsed_ms):
+        """记录经代理的请求结果，延迟或错误率超标时切换代理"""
+        if not self.proxy_pool or not self.proxy:
+            return
+        self.proxy_pool.report(self.proxy, ok, elapsed_ms)
+        if not self.proxy_pool.should_failover(self.proxy):
+            return
+        new_proxy = self.proxy_pool.failover(self.username, self.proxy)
+        if not new_proxy:
+            logger.warning(f"代理 {self.proxy} 表现不佳，但没有其他可用代理")
+            return
+        logger.warning(f"代理 {self.proxy} 延迟或错误率过高，切换到 {new_proxy}")
+        self.recorder.record("proxy_failover", old=self.proxy, new=new_proxy)
+        self.proxy = new_proxy
+        self.session.proxies = {"http": new_proxy, "https": new_proxy}
+        self.telemetry.count("proxy_failovers")
+        if self._browser is not None:
+            self.browser_stale = True
+
+    def navigate(self, page, url, **kwargs):
+        """整页导航并计时"""
+        start = time.perf_counter()
+        ok = False
+        try:
+            with self.telemetry.span("navigate"):
+                ok = page.get(url, **kwargs)
+            return ok
+        finally:
+            self.recorder.record("navigate", url=url, ok=bool(ok), ms=round((time.perf_counter() - start) * 1000, 1))
+
+    def new_tab(self):
+        """在当前账号的浏览器上下文中打开新标签页"""
+        page = self._create_tab()
+        apply_user_agent(page)
+        self.telemetry.instrument_page(page)
+        self.recorder.instrument_page(page)
+        self.traffic.attach(page)
+        if self.blocker:
+            self.blocker.attach(page)
+        self.capture.attach(page)
+        if self.cassette:
+            self.cassette.attach(page)
+        return page
+
+    def _create_tab(self):
+        """辅助函数：创建标签页"""
+        if not self.context_id:
+            return self.browser.new_tab()
+        # DrissionPage 的 new_tab(new_context=True) 每次都会新建上下文，这里需要复用同一个
+        target_id = self.browser._run_cdp(
+            "Target.createTarget", url="", browserContextId=self.context_id
+        )["targetId"]
+        for _ in range(500):
+            if target_id in self.browser.tab_ids:
+                break
+            time.sleep(0.01)
+        return self.browser.get_tab(target_id)
+
+    def close_browser(self):
+        """关闭浏览器（共享模式下只销毁本账号的上下文）"""
+        if self._browser is None:
+            return
+        self.sample_rss()
+        self.memory.stop()
+        if self.tab_pool:
+            self.tab_pool.close()
+        try:
+            self._page.close()
+        except Exception:
+            pass
+        try:
+            if self.owns_browser:
+                self._browser.quit()
+            elif self.context_id:
+                self._browser._run_cdp("Target.disposeBrowserContext", browserContextId=self.context_id)
+        except Exception:
+            pass
+        self._browser = None
+        self._page = None
+        self.context_id = None
+        if self.profile_lock:
+            self.profile_lock.close()
+            self.profile_lock = None
 
     def load_cookies(self):
         """加载本地 Cookie"""
-        if not os.path.exists(COOKIE_FILE):
+        if not os.path.exists(self.cookie_file):
              return False
         
         try:
-            with open(COOKIE_FILE, 'r', encoding='utf-8') as f:
+            with open(self.cookie_file, 'r', encoding='utf-8') as f:
                 cookies = json.load(f)
             
             # 注入到 Session
             for cookie in cookies:
                 # 简单处理：将 dict 转换为 cookie jar 所需格式，或者直接 set
                 # 这里假设 cookie 是 list of dict
-                self.session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain', '.linux.do'))
+                self.session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain', COOKIE_DOMAIN))
             
-            # 注入到 Browser
-            self.page.set.cookies(cookies)
+            # 浏览器已启动时注入到 Browser，否则在启动浏览器时注入
+            if self._page is not None:
+                self._page.set.cookies(cookies)
             logger.info(f"已加载本地 Cookie ({len(cookies)} 个)")
             return True
         except Exception as e:
@@ -160,31 +2822,111 @@ class LinuxDoUpgrade:
     def save_cookies(self):
         """保存 Cookie 到本地"""
         try:
-            # 优先保存浏览器中的 Cookie，因为可能包含更多动态生成的
-            cookies = self.page.cookies.as_list()
-            # 过滤只保存 linux.do 相关
-            filtered_cookies = [c for c in cookies if 'linux.do' in c.get('domain', '')]
+            # 优先保存浏览器中的 Cookie，因为可能包含更多动态生成的；未启动浏览器时保存 Session 中的
+            cookies = self._page.cookies(all_info=True) if self._page is not None else self.session_cookie_list()
+            # 过滤只保存站点相关
+            # cf_clearance 带过期时间单独保存（见 store_cf_clearance），不混入 Cookie 文件
+            filtered_cookies = [
+                c for c in cookies if SITE_HOST in c.get('domain', '') and c.get('name') != "cf_clearance"
+            ]
             
             if filtered_cookies:
-                with open(COOKIE_FILE, 'w', encoding='utf-8') as f:
+                with open(self.cookie_file, 'w', encoding='utf-8') as f:
                     json.dump(filtered_cookies, f, indent=2, ensure_ascii=False)
                 logger.success("Cookie 已保存到本地")
         except Exception as e:
             logger.warning(f"保存 Cookie 失败: {e}")
 
+    def session_cookie_list(self):
+        """Session 中站点相关的 Cookie（浏览器可直接注入的格式）"""
+        return [
+            {"name": c.name, "value": c.value, "domain": c.domain or COOKIE_DOMAIN, "path": c.path or "/"}
+            for c in self.session.cookies.jar
+            if SITE_HOST in (c.domain or SITE_HOST)
+        ]
+
+    @timed("login")
     @retry_decorator(retries=2, delay=2)
     def login(self):
-        """登录 Linux.Do (DrissionPage 浏览器模拟)"""
+        """登录 Linux.Do（优先 HTTP，被 Cloudflare 拦截时回退到浏览器）"""
         logger.info("开始登录流程...")
-        
+        has_cookies = self.load_cookies()
+        self.apply_cf_clearance()
+
+        if LOGIN_MODE != "browser":
+            # 只有 Cloudflare 拦截才需要浏览器；网络错误、5xx 等异常浏览器也无能为力，交给重试
+            result = self.login_http(has_cookies)
+            if result is not None:
+                return result
+            logger.warning("HTTP 登录被 Cloudflare 拦截，回退到浏览器登录")
+        return self.login_browser(has_cookies)
+
+    def check_session_http(self):
+        """通过 /session/current.json 校验登录状态，被 Cloudflare 拦截时返回 None"""
+        resp = self.api_get("session/current.json")
+        if is_cf_challenge(resp):
+            return None
+        return resp.status_code == 200 and bool(resp.json().get("current_user"))
+
+    def login_http(self, has_cookies=False):
+        """HTTP 登录：先校验 Cookie，失效时用账号密码登录
+
+        被 Cloudflare 拦截时返回 None；网络错误等其他异常直接抛出，由调用方区分处理。
+        """
+        if has_cookies:
+            logger.info("尝试使用 Cookie 验证登录 (HTTP)...")
+            status = self.check_session_http()
+            if status is None:
+                return None
+            if status:
+                logger.success("Cookie 登录验证成功！")
+                return True
+            logger.warning("Cookie 失效，转为密码登录")
+
+        logger.info("执行账号密码登录 (HTTP 模式)...")
+        resp = self.api_get("session/csrf")
+        if is_cf_challenge(resp):
+            return None
+        resp.raise_for_status()
+        self.csrf_token = resp.json().get("csrf")
+
+        resp = self.api_post(
+            "session",
+            data={
+                "login": self.username,
+                "password": self.password,
+                "second_factor_method": "1",
+                "timezone": "Asia/Shanghai",
+            },
+        )
+        if is_cf_challenge(resp):
+            return None
+        data = resp.json()
+        if data.get("error"):
+            logger.error(f"登录失败: {data['error']}")
+            return False
+
+        # 登录后会话重置，CSRF Token 需要重新获取
+        self.csrf_token = None
+        status = self.check_session_http()
+        if status:
+            logger.success("登录成功!")
+            self.save_cookies()
+        return status
+
+    def login_browser(self, has_cookies=False):
+        """登录 Linux.Do (DrissionPage 浏览器模拟)"""
         # 尝试 Cookie 登录
-        if self.load_cookies():
+        if has_cookies:
             logger.info("尝试使用 Cookie 验证登录...")
             try:
-                self.page.get(HOME_URL)
-                time.sleep(5)
-                if self.check_login_status():
+                self.navigate(self.page, HOME_URL)
+                self.wait_for_cf_challenge(self.page)
+                wait_for_app_ready(self.page)
+                self.traffic.record_paint(self.page)
+                if wait_for_selector(self.page, "#current-user", timeout=2) or self.check_login_status():
                     logger.success("Cookie 登录验证成功！")
+                    self.sync_cookies_to_session()
                     return True
                 else:
                     logger.warning("Cookie 失效，转为密码登录")
@@ -194,13 +2936,12 @@ class LinuxDoUpgrade:
         # 密码登录流程
         logger.info("执行账号密码登录 (浏览器模式)...")
         try:
-            self.page.get(LOGIN_URL)
-            time.sleep(3)
+            self.navigate(self.page, LOGIN_URL)
+            self.traffic.record_paint(self.page)
             
             # 检测 Cloudflare
-            if "Just a moment" in self.page.title:
-                logger.warning("检测到 Cloudflare 验证页面，等待自动跳过...")
-                time.sleep(10)
+            if not self.wait_for_cf_challenge(self.page):
+                return False
             
             # 等待登录框出现
             logger.info("寻找登录输入框...")
@@ -212,7 +2953,6 @@ class LinuxDoUpgrade:
                 login_btn_top = self.page.ele(".login-button")
                 if login_btn_top:
                     login_btn_top.click()
-                    time.sleep(2)
                     user_input = self.page.ele("#login-account-name", timeout=10)
             
             if not user_input:
@@ -220,8 +2960,8 @@ class LinuxDoUpgrade:
                 return False
                 
             user_input.clear()
-            user_input.input(USERNAME)
-            time.sleep(0.5)
+            user_input.input(self.username)
+            self.scheduler.pace("typing")
             
             # 输入密码
             pwd_input = self.page.ele("#login-account-password")
@@ -230,8 +2970,8 @@ class LinuxDoUpgrade:
                 return False
                 
             pwd_input.clear()
-            pwd_input.input(PASSWORD)
-            time.sleep(0.5)
+            pwd_input.input(self.password)
+            self.scheduler.pace("typing")
             
             # 点击登录
             login_btn = self.page.ele("#login-button")
@@ -243,16 +2983,14 @@ class LinuxDoUpgrade:
             logger.info("已点击登录按钮，等待跳转...")
             
             # 等待登录成功
-            for i in range(20):
-                time.sleep(1)
-                if self.check_login_status():
-                    logger.success("登录成功!")
-                    
-                    # 登录成功后同步 Cookie 到 session (用于通知等)
-                    self.sync_cookies_to_session()
-                    # 保存 Cookie 到本地
-                    self.save_cookies()
-                    return True
+            if wait_for_selector(self.page, "#current-user", timeout=20) or self.check_login_status():
+                logger.success("登录成功!")
+                
+                # 登录成功后同步 Cookie 到 session (用于通知等)
+                self.sync_cookies_to_session()
+                # 保存 Cookie 到本地
+                self.save_cookies()
+                return True
             
             logger.error("登录超时，未检测到登录成功状态")
             return False
@@ -261,40 +2999,84 @@ class LinuxDoUpgrade:
             logger.error(f"登录过程发生异常: {e}")
             return False
 
+    def apply_cf_clearance(self):
+        """复用已保存的 cf_clearance：HTTP 请求直接带上，浏览器启动时随 Session Cookie 注入"""
+        entry = load_cf_clearance(self.proxy)
+        if not entry:
+            return False
+        self.session.cookies.set("cf_clearance", entry["value"], domain=entry.get("domain") or COOKIE_DOMAIN)
+        if self._page is not None:
+            self._page.set.cookies(self.session_cookie_list())
+        remaining = int(entry["expires"] - time.time())
+        logger.info(f"复用已保存的 cf_clearance（剩余 {remaining // 60} 分钟）")
+        return True
+
+    def forget_cf_clearance(self):
+        """cf_clearance 被 Cloudflare 拒绝（过期或出口变化）时删除，下次由浏览器重新验证"""
+        logger.warning("cf_clearance 已失效，已删除本地记录")
+        self.session.cookies.delete("cf_clearance")
+        save_cf_clearance(self.proxy, None)
+
+    def store_cf_clearance(self, page):
+        """验证通过后保存浏览器拿到的 cf_clearance（连同过期时间），按浏览器实际使用的代理归档；出口与 Session 一致时同步给 Session"""
+        cookie = next((c for c in page.cookies(all_info=True) if c.get("name") == "cf_clearance"), None)
+        if not cookie:
+            return False
+        expires = cookie.get("expires") or -1
+        if expires <= 0:
+            expires = time.time() + CF_CLEARANCE_DEFAULT_TTL
+        entry = {
+            "value": cookie["value"],
+            "domain": cookie.get("domain") or COOKIE_DOMAIN,
+            "expires": expires,
+            "user_agent": user_agent(),
+        }
+        save_cf_clearance(self.browser_proxy, entry)
+        if self.browser_proxy == self.proxy:
+            self.session.cookies.set("cf_clearance", entry["value"], domain=entry["domain"])
+        logger.info(f"已保存 cf_clearance（{int(expires - time.time()) // 60} 分钟后过期）")
+        return True
+
+    def wait_for_cf_challenge(self, page):
+        """页面为 Cloudflare 验证页时轮询到验证通过为止，通过后保存 cf_clearance；超时返回 False"""
+        if "Just a moment" not in page.title:
+            return True
+        logger.warning("检测到 Cloudflare 验证页面，等待自动跳过...")
+        start = time.monotonic()
+        with self.telemetry.span("cf_challenge"):
+            passed = wait_until(lambda: "Just a moment" not in page.title, timeout=CF_CHALLENGE_TIMEOUT, interval=0.5)
+        self.recorder.record("cf_challenge", passed=passed, seconds=round(time.monotonic() - start, 1))
+        if not passed:
+            logger.error(f"Cloudflare 验证 {CF_CHALLENGE_TIMEOUT:.0f}s 内未通过")
+            return False
+        logger.success(f"Cloudflare 验证通过，耗时 {time.monotonic() - start:.1f}s")
+        self.store_cf_clearance(page)
+        return True
+
     def sync_cookies_to_session(self):
         """同步浏览器 Cookie 到 requests session"""
+        if self._page is None:
+            return
         try:
-            cookies = self.page.cookies.as_dict()
+            cookies = self.page.cookies().as_dict()
             self.session.cookies.update(cookies)
             logger.info(f"已同步 {len(cookies)} 个 Cookie 到 Session")
         except Exception as e:
             logger.warning(f"同步 Cookie 失败: {e}")
             
     def check_login_status(self):
-        """检查页面是否已登录"""
-        try:
-            user_ele = self.page.ele("@id=current-user")
-            if user_ele:
-                return True
-                
-            if "avatar" in self.page.html:
-                # 再次确认不是默认头像或登录按钮
-                return True
-                
-            return False
-        except:
-            return False
+        """检查页面是否已登录（优先使用页面已加载的当前用户数据，否则一次 JS 探测）"""
+        if self.capture.current_user:
+            return True
+        return bool(probe_login(self.page).get("logged_in"))
     
     def wait_for_page_load(self, timeout: int = 10):
         """等待页面加载完成"""
         try:
-            for i in range(timeout):
-                # 检查页面是否加载完成
-                ready_state = self.page.run_js("return document.readyState")
-                if ready_state == "complete":
-                    logger.debug(f"页面加载完成 (耗时 {i}秒)")
-                    return True
-                time.sleep(1)
+            start = time.monotonic()
+            if wait_until(lambda: self.page.run_js("return document.readyState") == "complete", timeout):
+                logger.debug(f"页面加载完成 (耗时 {time.monotonic() - start:.1f}秒)")
+                return True
             logger.warning(f"等待 {timeout}秒后页面仍未完全加载")
             return False
         except Exception as e:
@@ -306,115 +3088,313 @@ class LinuxDoUpgrade:
         logger.info(f"\n{'='*50}")
         logger.info("🚀 开始执行升级任务")
         logger.info(f"{'='*50}")
+
+        # 优先通过话题索引挑选未读收益高的话题，失败时回退到抓取 /latest 页面
+        entries = []
+        if self.topic_index:
+            self.sync_cookies_to_session()
+            picked = self.pick_topics(self.targets['topics_to_browse'], engine="browser")
+            entries = [(f"{HOME_URL}t/{t['slug']}/{t['id']}", t['title']) for t in picked]
+        if not entries:
+            entries = self.collect_topic_entries()
+            if not entries:
+                return False
+            # 跳过今天之前的运行已读完的话题
+            entries = [entry for entry in entries if not self.read_today(topic_id_from_url(entry[0]))]
+
+        # 按剩余时间裁剪计划
+        entries = entries[:self.scheduler.topic_budget(len(entries), "browser", max(BROWSE_CONCURRENCY, 1))]
+
+        if BROWSE_CONCURRENCY > 1:
+            self.browse_topics_pipelined(entries, BROWSE_CONCURRENCY)
+            return True
+
+        for i, (topic_url, topic_title) in enumerate(entries, 1):
+            if self.goals_met():
+                logger.success("已达到升级要求，提前结束浏览")
+                break
+            if not self.scheduler.can_start_topic("browser"):
+                logger.warning("剩余时间不足，提前结束浏览")
+                break
+            try:
+                self.recycle_browser_if_needed()
+                logger.info(f"[{i}/{len(entries)}] 处理主题...")
+                start = time.monotonic()
+                self.browse_one_topic(topic_url, topic_title)
+                self.scheduler.record_topic(time.monotonic() - start)
+                
+                # 随机延迟
+                if i < len(entries):
+                    self.scheduler.pace("between_topics", bucket="topic")
+            except Exception as e:
+                logger.warning(f"处理主题时出错: {e}")
+                continue
         
+        return True
+
+    def collect_topic_entries(self):
+        """从 /latest 页面抓取并随机选择话题，返回 [(url, 标题)]"""
         # 导航到最新话题页面
         try:
             logger.info("导航到最新话题页面...")
             # 设置超时和重试
-            self.page.get(f"{HOME_URL}latest", timeout=20, retry=2)
-            time.sleep(5)  # 等待动态内容渲染
+            self.navigate(self.page, f"{HOME_URL}latest", timeout=20, retry=2)
         except Exception as e:
             logger.error(f"导航失败: {e}")
             # 尝试刷新一次
             try:
                 logger.info("尝试刷新页面...")
                 self.page.refresh()
-                time.sleep(5)
             except Exception as e2:
                 logger.error(f"刷新失败: {e2}")
                 return False
-        
-        # 查找主题列表
-        try:
-            list_area = self.page.ele("@id=list-area", timeout=15)
-            if not list_area:
-                logger.error("未找到主题列表区域")
-                return False
-            
-            topic_list = list_area.eles(".:title")
-        except Exception as e:
-            logger.error(f"查找主题列表失败: {e}")
-            # 尝试备用选择器
-            try:
-                logger.info("尝试备用选择器...")
-                topic_list = self.page.eles(".topic-list-item .title")
-            except Exception as e2:
-                logger.error(f"备用选择器也失败: {e2}")
-                return False
-        if not topic_list:
+
+        # 优先使用前端已拿到的话题列表 JSON，不需要等待列表渲染
+        self.capture.harvest_preloaded(self.page)
+        entries = self.capture.topic_entries()
+        if entries:
+            logger.info(f"发现 {len(entries)} 个主题帖，随机选择 {self.targets['topics_to_browse']} 个")
+            return random.sample(entries, min(self.targets['topics_to_browse'], len(entries)))
+
+        # 回退：从页面 DOM 抓取
+        wait_for_selector(self.page, "#list-area .title", timeout=15)  # 等待动态内容渲染
+        entries = extract_topic_links(self.page)
+        if not entries:
             logger.error("未找到主题帖")
-            # 调试：打印页面标题和少量 HTML
-            logger.debug(f"当前页面标题: {self.page.title}")
-            logger.debug(f"页面源码前 500 字符: {self.page.html[:500]}")
+            # 调试：只取页面摘要，不拉取整页 HTML
+            logger.debug(f"页面摘要: {page_excerpt(self.page)}")
             return False
-        
-        logger.info(f"发现 {len(topic_list)} 个主题帖，随机选择 {UPGRADE_CONFIG['topics_to_browse']} 个")
-        
-        selected_topics = random.sample(
-            topic_list, 
-            min(UPGRADE_CONFIG['topics_to_browse'], len(topic_list))
-        )
-        
-        for i, topic in enumerate(selected_topics, 1):
-            try:
-                logger.info(f"[{i}/{len(selected_topics)}] 处理主题...")
-                
-                # 安全获取标题和URL
+
+        logger.info(f"发现 {len(entries)} 个主题帖，随机选择 {self.targets['topics_to_browse']} 个")
+        return random.sample(entries, min(self.targets['topics_to_browse'], len(entries)))
+
+    def browse_topics_pipelined(self, entries, workers: int):
+        """并发浏览话题：多个标签页同时浏览，并在浏览当前话题时预加载下一个话题
+
+        各标签页共用同一个浏览器，这里不调用 recycle_browser_if_needed：内存预算和代理切换后的浏览器重启只在顺序浏览时生效。
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        workers = max(1, min(workers, len(entries)))
+        logger.info(f"并发浏览模式: {workers} 个标签页, {len(entries)} 个话题")
+        queue = list(entries)
+        total = len(entries)
+
+        def next_item(loader):
+            with self.lock:
+                if not queue:
+                    return None
+                index = total - len(queue) + 1
+                topic_url, topic_title = queue.pop(0)
+            return index, topic_url, topic_title, submit_in_context(loader, self.acquire_topic_tab, topic_url)
+
+        def worker(loader, slot):
+            item = next_item(loader)
+            while item:
+                index, topic_url, topic_title, future = item
+                if self.goals_met() or not self.scheduler.can_start_topic("browser"):
+                    logger.warning("已达到升级要求或剩余时间不足，提前结束浏览")
+                    try:
+                        self.release_topic_tab(future.result())
+                    except Exception:
+                        pass
+                    break
+                # 预加载下一个话题
+                item = next_item(loader)
+                logger.info(f"[{index}/{total}] 处理主题...")
+                start = time.monotonic()
                 try:
-                    topic_url = topic.attr("href")
-                    # 使用 JavaScript 获取文本，避免超时
-                    topic_title = topic.owner.run_js("return arguments[0].textContent;", topic) or ""
+                    page = future.result()
                 except Exception as e:
-                    logger.debug(f"获取主题信息失败: {e}")
-                    topic_url = topic.attr("href") if hasattr(topic, 'attr') else ""
-                    topic_title = ""
-                
-                if not topic_url:
-                    logger.debug("跳过无效主题")
-                    continue
-                
-                self.browse_one_topic(topic_url, topic_title)
-                
-                # 随机延迟
-                if i < len(selected_topics):
-                    delay = random.uniform(5, 10)
-                    time.sleep(delay)
-            except Exception as e:
-                logger.warning(f"处理主题时出错: {e}")
-                continue
-        
-        return True
+                    logger.debug(f"预加载话题失败，改为直接打开: {e}")
+                    page = None
+                try:
+                    if page is None:
+                        self.browse_one_topic(topic_url, topic_title)
+                    else:
+                        try:
+                            with self.telemetry.span("browse_one_topic"):
+                                self.browse_loaded_topic(page, topic_title)
+                        finally:
+                            self.release_topic_tab(page)
+                except Exception as e:
+                    logger.warning(f"处理主题时出错: {e}")
+                self.scheduler.record_topic(time.monotonic() - start)
+                # 每个标签页保持各自的拟人节奏（各用一个令牌桶，否则所有标签页会被同一个桶串行化）
+                if item:
+                    self.scheduler.pace("between_topics", bucket=f"topic:{slot}")
+
+        with ThreadPoolExecutor(max_workers=workers) as loader, ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [submit_in_context(pool, worker, loader, slot) for slot in range(workers)]
+            for future in futures:
+                future.result()
+
+    def acquire_topic_tab(self, topic_url):
+        """打开并加载话题标签页（启用标签页池时复用已有标签页）"""
+        start = time.perf_counter()
+        if self.tab_pool:
+            page = self.tab_pool.acquire(topic_url)
+        else:
+            page = self.new_tab()
+            try:
+                self.navigate(page, topic_url)
+            except Exception:
+                page.close()
+                raise
+        with self.lock:
+            self.topic_latencies.append(time.perf_counter() - start)
+        return page
+
+    def release_topic_tab(self, page):
+        """归还或关闭话题标签页"""
+        if self.tab_pool:
+            self.tab_pool.release(page)
+        else:
+            page.close()
 
+    @timed("browse_one_topic")
     @retry_decorator(retries=2, delay=2)
     def browse_one_topic(self, topic_url, topic_title: str = ""):
         """浏览单个话题"""
-        new_page = self.browser.new_tab()
+        new_page = self.acquire_topic_tab(topic_url)
         try:
-            new_page.get(topic_url)
-            time.sleep(2)
-            
-            # 智能滚动浏览
-            self.smart_scroll(new_page)
-            
-            # 点赞（每主题 1-2 次）
-            if self.stats['likes_given'] < UPGRADE_CONFIG['likes_to_give']:
-                liked = self.like_posts_in_topic(new_page, max_likes=2)
-                if liked > 0:
-                    logger.info(f"👍 点赞 {liked} 次 (总计:{self.stats['likes_given']})")
-            
-            # 回复（控制频率）
-            if self.stats['replies_posted'] < UPGRADE_CONFIG['replies_to_post']:
-                if random.random() < 0.3:  # 30% 概率回复
-                    if self.reply_to_topic(new_page, topic_title):
-                        logger.info(f"💬 回复成功 (总计:{self.stats['replies_posted']})")
-            
-            self.stats['topics_browsed'] += 1
-            
+            self.browse_loaded_topic(new_page, topic_title)
         finally:
-            new_page.close()
+            self.release_topic_tab(new_page)
+
+    def browse_loaded_topic(self, new_page, topic_title: str = ""):
+        """在已打开的话题页中滚动、点赞、回复"""
+        wait_for_selector(new_page, ".topic-post", timeout=10)
+        topic_id = topic_id_from_url(new_page.url)
+        # 整页加载的话题没有 XHR，从预加载数据中补齐
+        if topic_id and self.capture.topic(topic_id) is None:
+            self.capture.harvest_preloaded(new_page)
+        topic = self.capture.topic(topic_id) if topic_id else None
+        if topic and self.topic_index:
+            self.topic_index.update([topic])
+        
+        # 智能滚动浏览
+        summary = self.smart_scroll(new_page)
+        self.record_topic_progress(new_page, summary.get("last_post_number"))
+        self.sample_rss()
+        
+        if WRITE_MODE == "api":
+            # 通过接口点赞和回复，不依赖页面 DOM；帖子数据来自页面已加载的 JSON
+            if topic_id:
+                try:
+                    self.queue_topic_actions(topic_id, posts=self.capture.posts_for(topic_id), topic_title=topic_title)
+                except Exception as e:
+                    logger.debug(f"接口点赞/回复失败: {e}")
+            self.incr_stat('topics_browsed')
+            self.journal_record("topic", topic_id)
+            return
+
+        # 点赞（每主题 1-2 次）
+        if self.stats['likes_given'] < self.targets['likes_to_give']:
+            liked = self.like_posts_in_topic(new_page, max_likes=2)
+            if liked > 0:
+                logger.info(f"👍 点赞 {liked} 次 (总计:{self.stats['likes_given']})")
+        
+        # 回复（控制频率）
+        if self.stats['replies_posted'] < self.targets['replies_to_post']:
+            if random.random() < 0.3:  # 30% 概率回复
+                if self.reply_to_topic(new_page, topic_title):
+                    logger.info(f"💬 回复成功 (总计:{self.stats['replies_posted']})")
+        
+        self.incr_stat('topics_browsed')
+        self.journal_record("topic", topic_id)
+
+    def record_topic_progress(self, page, post_number=None):
+        """把当前视口内最后一个帖子的楼层记入话题索引"""
+        if not self.topic_index:
+            return
+        try:
+            match = re.search(r"/t/[^/]+/(\d+)", page.url)
+            post_number = post_number or page.run_js("""
+                let last = 0;
+                document.querySelectorAll('article[id^="post_"]').forEach(e => {
+                    if (e.getBoundingClientRect().top < window.innerHeight) {
+                        last = Math.max(last, parseInt(e.id.slice(5)) || 0);
+                    }
+                });
+                return last;
+            """)
+            if match:
+                self.mark_topic_read(int(match.group(1)), post_number)
+        except Exception as e:
+            logger.debug(f"记录阅读进度失败: {e}")
 
+    # 页面内滚动驱动：一次注入执行完整的滚动计划，通过 IntersectionObserver 统计进入视口的帖子
+    SCROLL_DRIVER_JS = """
+        const plan = arguments[0];
+        return new Promise(resolve => {
+            const seen = new Set();
+            let last = 0, i = 0, atBottom = false, prevUrl = null;
+            const io = new IntersectionObserver(entries => {
+                for (const e of entries) {
+                    if (e.isIntersecting) {
+                        seen.add(e.target.id);
+                        last = Math.max(last, parseInt(e.target.id.slice(5)) || 0);
+                    }
+                }
+            });
+            const observe = () => document.querySelectorAll('article[id^="post_"]').forEach(el => io.observe(el));
+            const mo = new MutationObserver(observe);
+            observe();
+            mo.observe(document.body, {childList: true, subtree: true});
+            const finish = () => {
+                mo.disconnect();
+                // 等待最后一次滚动的交叉回调
+                setTimeout(() => {
+                    io.disconnect();
+                    resolve({steps: i, posts_seen: seen.size, at_bottom: atBottom, last_post_number: last});
+                }, 150);
+            };
+            const step = () => {
+                if (i >= plan.length) return finish();
+                const s = plan[i++];
+                window.scrollBy(0, s.distance);
+                if (s.exit) return finish();
+                atBottom = window.scrollY + window.innerHeight >= document.body.scrollHeight;
+                const url = location.href;
+                if (url === prevUrl && atBottom) return finish();
+                prevUrl = url;
+                setTimeout(step, s.dwell);
+            };
+            step();
+        });
+    """
+
+    @timed("scroll")
     def smart_scroll(self, page):
-        """智能滚动浏览"""
+        """智能滚动浏览：在页面内执行整个滚动计划，只需一次 CDP 往返，失败时回退到逐步滚动"""
+        scroll_times = random.randint(3, 8)
+        plan = []
+        for _ in range(scroll_times):
+            plan.append({
+                "distance": random.randint(450, 650),
+                # 10% 概率提前退出
+                "exit": random.random() < 0.1,
+                "dwell": self.scheduler.delay_ms("scroll_step"),
+            })
+        timeout = sum(step["dwell"] for step in plan) / 1000 + 15
+        try:
+            summary = page.run_js(self.SCROLL_DRIVER_JS, plan, timeout=timeout)
+        except Exception as e:
+            logger.debug(f"页面内滚动失败，回退到逐步滚动: {e}")
+            summary = None
+        if not isinstance(summary, dict):
+            return self.smart_scroll_steps(page)
+
+        logger.debug(
+            f"滚动 {summary.get('steps')}/{scroll_times} 次, 阅读 {summary.get('posts_seen')} 帖"
+            f"{', 已到达页面底部' if summary.get('at_bottom') else ''}"
+        )
+        self.incr_stat('posts_read', summary.get('posts_seen') or 0)
+        return summary
+
+    def smart_scroll_steps(self, page):
+        """逐步滚动浏览（每步由 Python 驱动）"""
         prev_url = None
         scroll_times = random.randint(3, 8)
         
@@ -423,7 +3403,7 @@ class LinuxDoUpgrade:
             logger.debug(f"滚动 {i+1}/{scroll_times}: {scroll_distance}px")
             page.run_js(f"window.scrollBy(0, {scroll_distance})")
             
-            self.stats['posts_read'] += 1
+            self.incr_stat('posts_read')
             
             # 10% 概率提前退出
             if random.random() < 0.1:
@@ -433,7 +3413,7 @@ class LinuxDoUpgrade:
             # 检查是否到底部
             try:
                 at_bottom = page.run_js(
-                    "window.scrollY + window.innerHeight >= document.body.scrollHeight"
+                    "return window.scrollY + window.innerHeight >= document.body.scrollHeight"
                 )
             except Exception:
                 at_bottom = False
@@ -448,20 +3428,47 @@ class LinuxDoUpgrade:
                 logger.debug("已到达页面底部")
                 break
 
-            wait_time = random.uniform(1.5, 3)
-            time.sleep(wait_time)
+            self.scheduler.pace("scroll_step")
+        return {}
 
+    @timed("like")
     def like_posts_in_topic(self, page, max_likes: int = 2) -> int:
         """在当前话题中点赞帖子（每主题1-2次）"""
         liked_count = 0
         try:
+            # 页面已加载的帖子 JSON 可以直接给出可点赞的楼层，全部点过时不再查找按钮
+            topic_id = topic_id_from_url(page.url)
+            posts = self.capture.posts_for(topic_id) if topic_id else None
+            candidates = None
+            if posts is not None:
+                likeable = set(self.likeable_post_ids(posts))
+                if self.journal:
+                    likeable = {post_id for post_id in likeable if post_id not in self.journal.posts}
+                post_ids = {p["post_number"]: p["id"] for p in posts if p["id"] in likeable}
+                if not post_ids:
+                    logger.debug("本话题已加载的帖子都已点赞")
+                    return 0
+                candidates = list(post_ids)
+
             # 等待页面稳定
-            time.sleep(2)
+            wait_for_app_ready(page, timeout=5)
             
             # 使用 JavaScript 直接点赞（扩大选择器范围）
             for attempt in range(max_likes):
+                # 并发浏览时先占用配额，避免超出每日点赞数
+                if not self.reserve_quota('likes_given', self.targets['likes_to_give']):
+                    break
+                if not self.scheduler.take("like"):
+                    self.release_quota('likes_given')
+                    break
                 try:
                     result = page.run_js("""
+                        // 有帖子数据时只在可点赞的楼层中查找
+                        const candidates = arguments[0];
+                        let roots = candidates
+                            ? candidates.map(n => document.getElementById('post_' + n)).filter(Boolean)
+                            : [];
+                        if (!roots.length) roots = [document];
                         // 多种可能的点赞按钮选择器
                         const selectors = [
                             '.discourse-reactions-reaction-button', 
@@ -472,8 +3479,8 @@ class LinuxDoUpgrade:
                         ];
                         
                         // 寻找所有可见的按钮
-                        for (let sel of selectors) {
-                            let buttons = document.querySelectorAll(sel);
+                        for (let root of roots) for (let sel of selectors) {
+                            let buttons = root.querySelectorAll(sel);
                             for (let i = 0; i < buttons.length; i++) {
                                 let btn = buttons[i];
                                 // 检查是否已点赞
@@ -484,26 +3491,29 @@ class LinuxDoUpgrade:
                                     
                                     btn.scrollIntoView({block: 'center'});
                                     btn.click();
-                                    return true;
+                                    const post = btn.closest('article[id^="post_"]');
+                                    return post ? parseInt(post.id.slice(5)) || -1 : -1;
                                 }
                             }
                         }
                         return false;
-                    """)
+                    """, candidates)
                     
                     if result:
                         liked_count += 1
-                        self.stats['likes_given'] += 1
+                        post_id = post_ids.get(result) if candidates else None
+                        if post_id:
+                            self.capture.mark_liked(topic_id, post_id)
+                        self.journal_record("like", topic_id, post_id)
                         logger.success(f"👍 点赞成功 ({self.stats['likes_given']})")
-                        time.sleep(random.uniform(1.5, 2.5))
-                        
-                        if self.stats['likes_given'] >= UPGRADE_CONFIG['likes_to_give']:
-                            break
+                        self.scheduler.pace("after_like")
                     else:
+                        self.release_quota('likes_given')
                         logger.debug("未找到未点赞的按钮")
                         break
                         
                 except Exception as e:
+                    self.release_quota('likes_given')
                     logger.debug(f"点赞尝试失败:{e}")
                     continue
             
@@ -512,13 +3522,27 @@ class LinuxDoUpgrade:
             logger.debug(f"点赞功能异常:{e}")
             return 0
 
+    @timed("reply")
     def reply_to_topic(self, page, topic_title: str = "") -> bool:
         """回复话题（增强版）"""
         try:
+            # 并发浏览时先占用配额，失败时归还
+            if not self.reserve_quota('replies_posted', self.targets['replies_to_post']):
+                return False
             logger.info(f"回复话题: {topic_title[:40] if topic_title else '...'}")
-            
+            if self._do_reply(page):
+                return True
+            self.release_quota('replies_posted')
+            return False
+        except Exception as e:
+            logger.debug(f"回复失败: {str(e)}")
+            return False
+
+    def _do_reply(self, page) -> bool:
+        """辅助函数：点击回复按钮并提交回复内容"""
+        try:
             # 等待页面稳定
-            time.sleep(4)
+            wait_for_app_ready(page, timeout=5)
             
             # 使用 JavaScript 直接点击回复按钮（避免元素失效）
             try:
@@ -538,14 +3562,13 @@ class LinuxDoUpgrade:
                 if not clicked:
                     logger.info("未找到回复按钮，尝试滚动到底部...")
                     page.run_js("window.scrollTo(0, document.body.scrollHeight);")
-                    time.sleep(3)
-                    clicked = self._try_click_reply(page, selectors)
+                    clicked = wait_until(lambda: self._try_click_reply(page, selectors), timeout=5, interval=0.25)
                 
                 if not clicked:
                     logger.debug("最终未找到回复按钮")
                     return False
                 
-                time.sleep(3)
+                wait_for_selector(page, ".d-editor-input", visible=True, timeout=10)
             except Exception as e:
                 logger.debug(f"点击回复按钮失败:{e}")
                 return False
@@ -559,13 +3582,13 @@ class LinuxDoUpgrade:
                 
                 # 滚动到编辑器
                 page.run_js("arguments[0].scrollIntoView({block: 'center'});", editor)
-                time.sleep(1)
+                self.scheduler.pace("before_click")
                 
                 # 输入回复内容
                 reply_text = random.choice(REPLY_TEMPLATES)
                 editor.clear()
                 editor.input(reply_text)
-                time.sleep(2)
+                self.scheduler.pace("typing")
                 
                 # 查找提交按钮
                 submit_btn = page.ele("css:button.create")
@@ -575,11 +3598,18 @@ class LinuxDoUpgrade:
                 
                 # 滚动到提交按钮并点击
                 page.run_js("arguments[0].scrollIntoView({block: 'center'});", submit_btn)
-                time.sleep(1)
+                if not self.scheduler.pace("before_click", bucket="reply"):
+                    logger.debug("剩余时间不足，放弃回复")
+                    return False
+                mark = self.capture.reply_mark(page)
                 submit_btn.click()
-                time.sleep(3)
+                status = self.capture.wait_reply(page, mark, timeout=10)
+                if status != 200:
+                    reason = "未检测到提交响应" if status is None else f"HTTP {status}"
+                    logger.warning(f"回复提交未成功: {reason}")
+                    return False
                 
-                self.stats['replies_posted'] += 1
+                self.journal_record("reply", topic_id_from_url(page.url))
                 logger.success(f"💬 回复成功: {reply_text} ({self.stats['replies_posted']})")
                 return True
                 
@@ -611,32 +3641,295 @@ class LinuxDoUpgrade:
                 continue
         return False
 
-    def print_connect_info(self):
-        """打印连接信息"""
-        logger.info("获取连接信息")
+    # ================== HTTP 浏览引擎 ==================
+
+    def api_headers(self, extra=None):
+        """Discourse JSON 接口请求头"""
+        headers = {
+            "Accept": "application/json, text/javascript, */*; q=0.01",
+            "X-Requested-With": "XMLHttpRequest",
+            "Discourse-Present": "true",
+            "Discourse-Logged-In": "true",
+            "Referer": HOME_URL,
+            "Origin": HOME_URL.rstrip("/"),
+        }
+        if self.csrf_token:
+            headers["X-CSRF-Token"] = self.csrf_token
+        if extra:
+            headers.update(extra)
+        return headers
+
+    def get_csrf_token(self, refresh=False):
+        """获取 CSRF Token（缓存）"""
+        if self.csrf_token and not refresh:
+            return self.csrf_token
+        resp = self.session.get(CSRF_URL, headers=self.api_headers(), impersonate=IMPERSONATE, timeout=15)
+        resp.raise_for_status()
+        self.csrf_token = resp.json().get("csrf")
+        return self.csrf_token
+
+    def api_request(self, method, path, headers=None, **kwargs):
+        """请求 Discourse JSON 接口：遵守调度器节奏，并把结果反馈给调度器和代理池"""
+        kwargs.setdefault("timeout", 15)
+        self.scheduler.take("request")
+        start = time.perf_counter()
+        try:
+            resp = self.session.request(
+                method, f"{HOME_URL}{path.lstrip('/')}", headers=self.api_headers(headers),
+                impersonate=IMPERSONATE, **kwargs
+            )
+        except Exception:
+            self.report_proxy(False, (time.perf_counter() - start) * 1000)
+            raise
+        self.report_proxy(resp.status_code < 500, (time.perf_counter() - start) * 1000)
+        self.scheduler.on_response(resp)
+        if is_cf_challenge(resp) and self.session.cookies.get("cf_clearance"):
+            self.forget_cf_clearance()
+        return resp
+
+    def api_get(self, path, headers=None, **kwargs):
+        """GET Discourse JSON 接口"""
+        return self.api_request("GET", path, headers, **kwargs)
+
+    def api_post(self, path, headers=None, **kwargs):
+        """POST Discourse JSON 接口（自动携带 CSRF Token）"""
+        self.get_csrf_token()
+        return self.api_request("POST", path, headers, **kwargs)
+
+    def api_put(self, path, headers=None, **kwargs):
+        """PUT Discourse JSON 接口（自动携带 CSRF Token）"""
+        self.get_csrf_token()
+        return self.api_request("PUT", path, headers, **kwargs)
+
+    def fetch_topic_list(self, source="latest"):
+        """通过 /latest.json 等接口获取话题列表"""
+        resp = self.api_get(f"{source}.json")
+        resp.raise_for_status()
+        return resp.json().get("topic_list", {}).get("topics", [])
+
+    def pick_topics(self, count, engine="browser"):
+        """从 /unread、/new、/latest 汇总候选话题，借助话题索引挑选未读收益最高的话题"""
+        candidates = {}
+        for source in ("unread", "new", "latest"):
+            try:
+                for t in self.fetch_topic_list(source):
+                    if t.get("id") and not t.get("pinned") and not self.read_today(t["id"]):
+                        candidates.setdefault(t["id"], t)
+            except Exception as e:
+                logger.debug(f"获取 /{source} 失败: {e}")
+        if not candidates:
+            return []
+
+        if not self.topic_index:
+            return random.sample(list(candidates.values()), min(count, len(candidates)))
+        self.topic_index.update(candidates.values())
+        picked = self.topic_index.rank(list(candidates), count, engine)
+        logger.info(f"候选话题 {len(candidates)} 个，按未读收益挑选 {len(picked)} 个")
+        return picked
+
+    def read_today(self, topic_id):
+        """话题今天是否已在之前的运行中读完"""
+        return bool(self.journal and topic_id in self.journal.topics)
+
+    def mark_topic_read(self, topic_id, post_number):
+        """更新话题索引中的已读楼层"""
+        if self.topic_index and topic_id and post_number:
+            self.topic_index.mark_read(topic_id, post_number)
+
+    @staticmethod
+    def reading_time_ms(post):
+        """根据帖子长度估算真实的阅读耗时（毫秒）"""
+        text = re.sub(r"<[^>]+>", "", post.get("cooked", "") or "")
+        # 约 15 字/秒的阅读速度，加上随机抖动
+        ms = len(text) / 15 * 1000 * random.uniform(0.8, 1.3)
+        return int(min(max(ms, random.uniform(1500, 3000)), 20000))
+
+    def browse_topics_http(self):
+        """浏览话题（HTTP 引擎，无需浏览器）"""
+        logger.info(f"\n{'='*50}")
+        logger.info("🚀 开始执行升级任务 (HTTP 引擎)")
+        logger.info(f"{'='*50}")
+
+        self.sync_cookies_to_session()
+        selected_topics = self.pick_topics(self.targets['topics_to_browse'], engine="http")
+        if not selected_topics:
+            logger.error("未找到主题帖")
+            return False
+
+        selected_topics = selected_topics[:self.scheduler.topic_budget(len(selected_topics), "http")]
+
+        for i, topic in enumerate(selected_topics, 1):
+            if self.goals_met():
+                logger.success("已达到升级要求，提前结束浏览")
+                break
+            if not self.scheduler.can_start_topic("http"):
+                logger.warning("剩余时间不足，提前结束浏览")
+                break
+            try:
+                logger.info(f"[{i}/{len(selected_topics)}] 处理主题: {topic.get('title', '')[:40]}")
+                start = time.monotonic()
+                self.browse_one_topic_http(topic["id"], topic.get("title", ""))
+                self.scheduler.record_topic(time.monotonic() - start)
+                if i < len(selected_topics):
+                    self.scheduler.pace("http_topic", bucket="topic")
+            except Exception as e:
+                logger.warning(f"处理主题时出错: {e}")
+                continue
+
+        return True
+
+    @timed("browse_one_topic")
+    def browse_one_topic_http(self, topic_id, topic_title: str = ""):
+        """浏览单个话题（HTTP 引擎）：拉取帖子，停留阅读时间后按实际经过的时间上报阅读时长"""
+        fetched_at = time.monotonic()
+        resp = self.api_get(
+            f"t/{topic_id}.json",
+            headers={"Discourse-Track-View": "true", "Discourse-Track-View-Topic-Id": str(topic_id)},
+        )
+        resp.raise_for_status()
+        posts = resp.json().get("post_stream", {}).get("posts", [])
+        if not posts:
+            logger.debug(f"话题 {topic_id} 没有可读帖子")
+            return 0
+
+        planned = {post["post_number"]: self.reading_time_ms(post) for post in posts if post.get("post_number")}
+        planned_ms = sum(planned.values())
+        self.scheduler.dwell(planned_ms / 1000)
+        # 上报的时长不能超过拉取话题以来真实经过的时间：topic_time 是停留在话题上的时间，
+        # 各帖阅读时长按比例压缩到这段时间之内
+        elapsed_ms = max(int((time.monotonic() - fetched_at) * 1000), 1)
+        scale = min(1.0, elapsed_ms / max(planned_ms, 1))
+        timings = {number: max(int(ms * scale), 1) for number, ms in planned.items()}
+        data = {f"timings[{number}]": ms for number, ms in timings.items()}
+        data["topic_id"] = topic_id
+        data["topic_time"] = elapsed_ms
+
+        resp = self.api_post("topics/timings", data=data)
+        resp.raise_for_status()
+
+        self.incr_stat('posts_read', len(timings))
+        self.incr_stat('topics_browsed')
+        self.journal_record("topic", topic_id)
+        self.mark_topic_read(topic_id, max(timings))
+        logger.debug(f"话题 {topic_id} 上报阅读 {len(timings)} 帖, 共 {data['topic_time']}ms")
+
+        if WRITE_MODE != "browser":
+            self.queue_topic_actions(topic_id, posts, topic_title)
+        return len(timings)
+
+    @staticmethod
+    def likeable_post_ids(posts):
+        """筛选可以点赞的帖子：非本人、未点过赞"""
+        post_ids = []
+        for post in posts:
+            if post.get("yours") or post.get("current_user_reaction"):
+                continue
+            like = next((a for a in post.get("actions_summary", []) if a.get("id") == 2), None)
+            if like and (like.get("acted") or not like.get("can_act", True)):
+                continue
+            post_ids.append(post["id"])
+        return post_ids
+
+    def queue_topic_actions(self, topic_id, posts=None, topic_title: str = ""):
+        """通过接口为话题点赞（每主题 1-2 次）和回复（30% 概率），提交后返回成功数"""
+        if posts is None:
+            resp = self.api_get(f"t/{topic_id}.json")
+            resp.raise_for_status()
+            posts = resp.json().get("post_stream", {}).get("posts", [])
+
+        post_ids = [
+            post_id for post_id in self.likeable_post_ids(posts)
+            if not (self.journal and post_id in self.journal.posts)
+        ]
+        for post_id in random.sample(post_ids, min(2, len(post_ids))):
+            if not self.actions.like(post_id):
+                break
+
+        if random.random() < 0.3:  # 30% 概率回复
+            if self.actions.reply(topic_id, random.choice(REPLY_TEMPLATES)):
+                logger.info(f"回复话题: {topic_title[:40] if topic_title else topic_id}")
+        return self.actions.flush()
+
+    def browse(self):
+        """按配置选择浏览引擎，HTTP 引擎失败时回退到浏览器"""
+        if BROWSE_ENGINE == "http":
+            if self.browse_topics_http():
+                return True
+            logger.warning("HTTP 引擎浏览失败，回退到浏览器引擎")
+        return self.browse_topics()
+
+    def fetch_connect_info(self):
+        """获取 connect.linux.do 的升级要求表，失败时返回空列表"""
         headers = {
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8",
         }
         try:
             resp = self.session.get(
-                "https://connect.linux.do/", headers=headers, impersonate="chrome136"
+                CONNECT_URL, headers=headers, impersonate=IMPERSONATE
             )
-            soup = BeautifulSoup(resp.text, "html.parser")
-            rows = soup.select("table tr")
-            info = []
-
-            for row in rows:
-                cells = row.select("td")
-                if len(cells) >= 3:
-                    project = cells[0].text.strip()
-                    current = cells[1].text.strip() if cells[1].text.strip() else "0"
-                    requirement = cells[2].text.strip() if cells[2].text.strip() else "0"
-                    info.append([project, current, requirement])
+            return parse_connect_table(resp.text)
+        except Exception as e:
+            logger.warning(f"获取连接信息失败: {e}")
+            return []
+
+    def print_connect_info(self):
+        """打印连接信息"""
+        logger.info("获取连接信息")
+        from tabulate import tabulate
 
+        info = self.fetch_connect_info()
+        if info:
             print("--------------Connect Info-----------------")
             print(tabulate(info, headers=["项目", "当前", "要求"], tablefmt="pretty"))
-        except Exception as e:
-            logger.warning(f"获取连接信息失败: {e}")
+
+    def plan_run(self):
+        """按升级要求的差距规划本次工作量，全部达标时返回 False"""
+        self.sync_cookies_to_session()
+        rows = self.fetch_connect_info()
+        gaps = requirement_gaps(rows)
+        if not gaps:
+            # 此时已登录成功，拿不到要求表通常是 Cookie 未同步或页面结构变化，需要关注
+            logger.warning(
+                f"未获取到升级要求（表格 {len(rows)} 行），按 UPGRADE_CONFIG 执行"
+            )
+            return True
+
+        self.gaps = gaps
+        logger.info("📋 升级要求差距: " + ", ".join(f"{key} {gap}" for key, gap in gaps.items()))
+        if "likes_given" in gaps:
+            self.targets["likes_to_give"] = min(UPGRADE_CONFIG["likes_to_give"], gaps["likes_given"])
+        if "replies_posted" in gaps:
+            self.targets["replies_to_post"] = min(UPGRADE_CONFIG["replies_to_post"], gaps["replies_posted"])
+        if "topics_browsed" in gaps or "posts_read" in gaps:
+            # 点赞和回复都要在话题里完成，话题数至少覆盖这两项
+            needed = max(
+                gaps.get("topics_browsed", 0),
+                math.ceil(gaps.get("posts_read", 0) / POSTS_PER_TOPIC_ESTIMATE),
+                self.targets["likes_to_give"],
+                self.targets["replies_to_post"],
+            )
+            self.targets["topics_to_browse"] = min(UPGRADE_CONFIG["topics_to_browse"], needed)
+        if gaps.get("days_visited"):
+            # 访问天数只能每天累积，登录本身就计入当天访问
+            logger.info(f"访问天数还差 {gaps['days_visited']}，本次登录已计入")
+        logger.info(
+            f"本次目标: 话题 {self.targets['topics_to_browse']} / 点赞 {self.targets['likes_to_give']} / "
+            f"回复 {self.targets['replies_to_post']}"
+        )
+        return any(
+            self.targets[key] > 0 for key in ("topics_to_browse", "likes_to_give", "replies_to_post")
+        )
+
+    def goals_met(self):
+        """本次运行是否已补齐所有可通过浏览补齐的差距"""
+        if not self.gaps:
+            return False
+        with self.lock:
+            return all(
+                self.stats[key] >= self.gaps[key]
+                for key in ("topics_browsed", "posts_read", "likes_given", "replies_posted")
+                if key in self.gaps
+            )
 
     def send_notifications(self):
         """发送多渠道通知"""
@@ -647,83 +3940,44 @@ class LinuxDoUpgrade:
             f"给出点赞: {self.stats['likes_given']}\n"
             f"发布回复: {self.stats['replies_posted']}"
         )
-        
-        # Telegram 通知
-        if TG_BOT_TOKEN and TG_CHAT_ID:
-            try:
-                tg_url = f"https://api.telegram.org/bot{TG_BOT_TOKEN}/sendMessage"
-                tg_data = {
-                    "chat_id": TG_CHAT_ID,
-                    "text": status_msg,
-                    "parse_mode": "HTML"
-                }
-                proxies = {"http": LINUXDO_PROXY, "https": LINUXDO_PROXY} if LINUXDO_PROXY else None
-                response = requests.post(tg_url, json=tg_data, timeout=10, impersonate="chrome136", proxies=proxies)
-                response.raise_for_status()
-                logger.success("✅ Telegram 通知发送成功")
-            except Exception as e:
-                logger.warning(f"⚠️ Telegram 通知发送失败: {e}")
-        
-        # Gotify 通知
-        if GOTIFY_URL and GOTIFY_TOKEN:
-            try:
-                proxies = {"http": LINUXDO_PROXY, "https": LINUXDO_PROXY} if LINUXDO_PROXY else None
-                response = requests.post(
-                    f"{GOTIFY_URL}/message",
-                    params={"token": GOTIFY_TOKEN},
-                    json={"title": "Linux.Do 升级任务", "message": status_msg, "priority": 5},
-                    timeout=10,
-                    impersonate="chrome136",
-                    proxies=proxies
-                )
-                response.raise_for_status()
-                logger.success("✅ Gotify 通知发送成功")
-            except Exception as e:
-                logger.warning(f"⚠️ Gotify 通知发送失败: {e}")
-        
-        # Server 酱³ 通知
-        if SC3_PUSH_KEY:
-            match = re.match(r"sct(\d+)t", SC3_PUSH_KEY, re.I)
-            if not match:
-                logger.warning("⚠️ SC3_PUSH_KEY 格式错误")
-            else:
-                uid = match.group(1)
-                url = f"https://{uid}.push.ft07.com/send/{SC3_PUSH_KEY}"
-                params = {"title": "Linux.Do 升级任务", "desp": status_msg}
-                
-                try:
-                    proxies = {"http": LINUXDO_PROXY, "https": LINUXDO_PROXY} if LINUXDO_PROXY else None
-                    response = requests.get(url, params=params, timeout=10, impersonate="chrome136", proxies=proxies)
-                    response.raise_for_status()
-                    logger.success("✅ Server 酱³ 通知发送成功")
-                except Exception as e:
-                    logger.warning(f"⚠️ Server 酱³ 通知发送失败: {e}")
+        for channel, (_, seconds) in push_notifications(status_msg).items():
+            self.telemetry.observe(f"notify:{channel}", seconds)
 
-        # 自定义 WeChat API 通知
-        if WECHAT_API_URL and WECHAT_AUTH_TOKEN:
-            try:
-                # 优先尝试 GET 请求
-                params = {
-                    "token": WECHAT_AUTH_TOKEN,
-                    "title": "Linux.Do 升级任务",
-                    "content": status_msg
-                }
-                response = requests.get(WECHAT_API_URL, params=params, timeout=10, impersonate="chrome136")
-                
-                # GET 失败 (405) 尝试 POST
-                if response.status_code == 405:
-                    logger.debug("自定义微信 GET 返回 405, 尝试 POST")
-                    response = requests.post(WECHAT_API_URL, json=params, timeout=10, impersonate="chrome136")
-                
-                if response.status_code >= 400:
-                     logger.warning(f"⚠️ 自定义微信通知 HTTP {response.status_code}: {response.text[:100]}")
-                else:
-                     logger.success("✅ 自定义微信通知发送成功")
-            except Exception as e:
-                logger.warning(f"⚠️ 自定义微信通知发送失败: {e}")
+    def dump_failure(self, reason):
+        """保存失败现场：最近事件、压缩的 DOM 和截图（浏览器未启动时只有事件）"""
+        try:
+            path = self.recorder.dump(reason, self.username, self._page)
+            logger.info(f"已保存失败现场: {path}")
+        except Exception as e:
+            logger.debug(f"保存失败现场失败: {e}")
 
-    def run(self):
-        """主运行函数"""
+    def export_metrics(self, exit_code):
+        """导出本次运行的 JSON 报告与 Prometheus textfile"""
+        try:
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            self.telemetry.write(
+                os.path.join(METRICS_DIR, f"linuxdo_metrics_{safe_account_name(self.username)}"),
+                {"account": self.username or ""},
+                {
+                    "account": self.username, "exit_code": exit_code, "engine": BROWSE_ENGINE, "stats": dict(self.stats),
+                    "blocked": dict(self.blocker.blocked) if self.blocker else {},
+                    "tab_pool": {"routed": self.tab_pool.routed, "reloaded": self.tab_pool.reloaded} if self.tab_pool else {},
+                },
+            )
+        except Exception as e:
+            logger.warning(f"导出运行指标失败: {e}")
+
+    def run(self, notify=True):
+        """主运行函数，结束后导出运行指标"""
+        exit_code = 9
+        try:
+            exit_code = self.run_tasks(notify)
+            return exit_code
+        finally:
+            self.export_metrics(exit_code)
+
+    def run_tasks(self, notify=True):
+        """依次执行登录、规划、浏览、统计与通知，返回退出码"""
         try:
             logger.info("==== Linux.Do 快速升级脚本开始 ====")
             
@@ -731,40 +3985,63 @@ class LinuxDoUpgrade:
             login_res = self.login()
             if not login_res:
                 logger.error("登录验证失败")
+                self.dump_failure("登录验证失败")
                 return 1
 
-            # 2. 浏览话题
-            if BROWSE_ENABLED:
+            # 2. 按升级要求规划工作量
+            work_needed = True
+            if PLAN_ENABLED:
+                work_needed = self.plan_run()
+                if not work_needed:
+                    logger.success("已满足全部升级要求，跳过浏览")
+            if work_needed and not self.apply_daily_budget():
+                work_needed = False
+                logger.success("今日额度已用完，跳过浏览")
+
+            # 3. 浏览话题
+            if BROWSE_ENABLED and work_needed:
                 try:
-                    browse_res = self.browse_topics()
+                    browse_res = self.browse()
                     if not browse_res:
                         logger.error("浏览话题失败")
-                        # 保存调试截图
-                        try:
-                            screenshot_path = "/ql/data/scripts/linuxdo_debug.png"
-                            self.page.get_screenshot(path=screenshot_path)
-                            logger.info(f"已保存调试截图: {screenshot_path}")
-                        except Exception as e:
-                            logger.debug(f"保存截图失败: {e}")
+                        self.dump_failure("浏览话题失败")
                         return 2
                     logger.success("完成浏览任务")
                 except Exception as e:
                     logger.error(f"浏览任务异常: {e}")
                     import traceback
                     traceback.print_exc()
+                    self.dump_failure(f"浏览任务异常: {e}")
                     return 2
 
-            # 3. 输出统计
+            # 4. 输出统计
             logger.info(f"\n{'='*50}")
             logger.info("📊 今日任务完成统计:")
             logger.info(f"  - 浏览话题: {self.stats['topics_browsed']}")
             logger.info(f"  - 阅读帖子: {self.stats['posts_read']}")
             logger.info(f"  - 给出点赞: {self.stats['likes_given']}")
             logger.info(f"  - 发布回复: {self.stats['replies_posted']}")
+            if self.topic_latencies:
+                latencies = sorted(self.topic_latencies)
+                p50 = latencies[len(latencies) // 2]
+                p90 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.9))]
+                logger.info(
+                    f"  - 话题加载耗时: p50 {p50:.2f}s / p90 {p90:.2f}s "
+                    f"(标签页池: {'开启' if self.tab_pool else '关闭'})"
+                )
+            logger.info(f"  - 流量: {self.traffic.summary()}")
+            if self.blocker:
+                logger.info(f"  - 拦截: {self.blocker.summary()}")
+            logger.info(f"  - 页面数据: {self.capture.summary()}")
+            if self.cassette:
+                logger.info(f"  - 录像: {self.cassette.summary()}")
+            self.sample_rss()
+            logger.info(f"  - 耗时: {self.telemetry.summary()}")
             logger.info(f"{'='*50}\n")
 
-            # 4. 发送通知
-            self.send_notifications()
+            # 5. 发送通知
+            if notify:
+                self.send_notifications()
             
             logger.info("==== Linux.Do 快速升级脚本结束 ====")
             return 0
@@ -773,20 +4050,232 @@ class LinuxDoUpgrade:
             logger.error(f"脚本异常: {e}")
             import traceback
             traceback.print_exc()
+            self.dump_failure(f"脚本异常: {e}")
             return 9
 
         finally:
+            self.close_browser()
+            if self._topic_index is not None:
+                self._topic_index.close()
+                self._topic_index = None
+
+
+def load_accounts(path):
+    """读取多账号文件
+
+    支持两种格式：
+    - JSON 列表：[{"username": "...", "password": "...", "proxy": "..."}]
+    - 纯文本：每行 username:password，# 开头为注释
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    accounts = []
+    if content.lstrip().startswith("["):
+        for item in json.loads(content):
+            if item.get("username") and item.get("password"):
+                accounts.append(item)
+    else:
+        for line in content.splitlines():
+            line = line.strip()
+            if not line or line.startswith("#") or ":" not in line:
+                continue
+            username, password = line.split(":", 1)
+            accounts.append({"username": username.strip(), "password": password.strip()})
+    return accounts
+
+
+class LinuxDoFleet:
+    """多账号模式：所有账号共享一个 Chromium 进程，每个账号运行在独立的浏览器上下文中
+
+    共享的 Chromium 启动时不带代理；每个账号首次需要浏览器时通过 Target.createBrowserContext 创建自己的
+    上下文，并以 proxyServer 指定该账号固定使用的代理。上下文之间 Cookie、缓存和存储互相隔离，
+    省去了每个账号单独启动浏览器的时间和内存。
+    """
+
+    LOG_FORMAT = (
+        "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | "
+        "<magenta>{extra[account]}</magenta> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - "
+        "<level>{message}</level>"
+    )
+
+    def __init__(self, accounts, workers: int = FLEET_WORKERS) -> None:
+        self.accounts = accounts
+        self.workers = max(1, min(workers, len(accounts)))
+        self.results = {}
+        self.browser = None
+        self.lock = threading.Lock()
+
+    def get_browser(self):
+        """共享浏览器（首个需要浏览器的账号启动它）"""
+        with self.lock:
+            if self.browser is None:
+                from DrissionPage import Chromium
+
+                logger.info("启动共享浏览器...")
+                # 不设置浏览器级代理：每个账号的上下文使用该账号固定的代理（见 start_browser）
+                self.browser = Chromium(build_chromium_options())
+            return self.browser
+
+    def run_account(self, account):
+        """运行单个账号（本账号产生的日志都带账号标记）"""
+        username = account["username"]
+        with logger.contextualize(account=username):
+            logger.info("账号开始运行")
+            app = None
             try:
-                self.page.close()
-                self.browser.quit()
-            except Exception:
-                pass
+                app = LinuxDoUpgrade(
+                    username=username,
+                    password=account["password"],
+                    proxy=account.get("proxy"),
+                    shared_browser=self.get_browser,
+                )
+                code = app.run(notify=False)
+                return code, app.stats
+            except Exception as e:
+                logger.error(f"账号运行异常: {e}")
+                return 9, app.stats if app else {}
 
+    def run(self, notify=True):
+        """主运行函数"""
+        from concurrent.futures import ThreadPoolExecutor
+        from tabulate import tabulate
 
-if __name__ == "__main__":
+        # 并发账号的日志交错输出，每行加上账号标记（账号之外的日志显示为 "-"）
+        logger.configure(extra={"account": "-"})
+        logger.remove()
+        logger.add(sys.stderr, format=self.LOG_FORMAT)
+        logger.info(f"==== 多账号模式: {len(self.accounts)} 个账号, 并发 {self.workers} ====")
+        if BROWSER_PROFILE_DIR:
+            # 共享浏览器中各账号的上下文不落盘，持久化配置只在单账号模式下生效
+            logger.warning("多账号模式不支持 BROWSER_PROFILE_DIR，已忽略")
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = {
+                    account["username"]: executor.submit(self.run_account, account)
+                    for account in self.accounts
+                }
+                for username, future in futures.items():
+                    self.results[username] = future.result()
+        finally:
+            if self.browser is not None:
+                try:
+                    self.browser.quit()
+                except Exception:
+                    pass
+
+        rows = []
+        for username, (code, stats) in self.results.items():
+            rows.append([
+                username,
+                "✅" if code == 0 else f"❌({code})",
+                stats.get('topics_browsed', 0),
+                stats.get('posts_read', 0),
+                stats.get('likes_given', 0),
+                stats.get('replies_posted', 0),
+            ])
+        print(tabulate(rows, headers=["账号", "状态", "话题", "帖子", "点赞", "回复"], tablefmt="pretty"))
+
+        failed = [username for username, (code, _) in self.results.items() if code != 0]
+        status_msg = f"Linux.Do 多账号升级任务完成 {'✅' if not failed else '⚠️'}\n" + "\n".join(
+            f"{row[0]}: {row[1]} 话题 {row[2]} / 帖子 {row[3]} / 点赞 {row[4]} / 回复 {row[5]}"
+            for row in rows
+        )
+        if notify:
+            push_notifications(status_msg)
+        return 0 if not failed else 1
+
+
+def require_credentials():
     if not USERNAME or not PASSWORD:
         print("Please set LINUXDO_USERNAME and LINUXDO_PASSWORD")
         exit(1)
-    
+
+
+def cmd_check_session(args):
+    """校验本地 Cookie 是否仍然有效（只走 HTTP，不启动浏览器）"""
+    app = LinuxDoUpgrade(probe_proxies=False)
+    if not app.load_cookies():
+        logger.warning("没有本地 Cookie")
+        return 1
+    status = app.check_session_http()
+    if status is None:
+        logger.warning("请求被 Cloudflare 拦截，无法确认登录状态")
+        return 2
+    if status:
+        logger.success("Cookie 有效")
+        return 0
+    logger.warning("Cookie 已失效")
+    return 1
+
+
+def cmd_connect_info(args):
+    """打印升级要求表（只走 HTTP 登录，不启动浏览器）"""
+    require_credentials()
+    app = LinuxDoUpgrade(probe_proxies=False)
+    try:
+        result = app.login_http(app.load_cookies())
+    except Exception as e:
+        logger.error(f"HTTP 登录异常: {e}")
+        return 1
+    if result is None:
+        logger.error("HTTP 登录被 Cloudflare 拦截")
+        return 1
+    if not result:
+        logger.error("HTTP 登录失败")
+        return 1
+    app.print_connect_info()
+    return 0
+
+
+def cmd_browse(args):
+    """登录并浏览，不发送通知"""
+    return cmd_run(args, notify=False)
+
+
+def cmd_notify_test(args):
+    """向所有已配置的渠道发送一条测试消息"""
+    report = push_notifications("Linux.Do 升级任务通知测试 ✅", use_outbox=False)
+    if not report:
+        logger.warning("没有已配置的通知渠道")
+        return 1
+    return 0 if all(ok for ok, _ in report.values()) else 1
+
+
+def cmd_run(args, notify=True):
+    """完整运行：登录、规划、浏览、统计和通知"""
+    if ACCOUNTS_FILE:
+        accounts = load_accounts(ACCOUNTS_FILE)
+        if not accounts:
+            print(f"No accounts found in {ACCOUNTS_FILE}")
+            exit(1)
+        return LinuxDoFleet(accounts).run(notify=notify)
+
+    require_credentials()
     app = LinuxDoUpgrade()
-    exit(app.run())
+    return app.run(notify=notify)
+
+
+COMMANDS = {
+    "check-session": cmd_check_session,
+    "connect-info": cmd_connect_info,
+    "browse": cmd_browse,
+    "notify-test": cmd_notify_test,
+    "run": cmd_run,
+}
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Linux.Do 快速升级")
+    subparsers = parser.add_subparsers(dest="command")
+    for name, func in COMMANDS.items():
+        subparsers.add_parser(name, help=func.__doc__)
+    args = parser.parse_args(argv)
+    # 不带子命令时保持原来的完整运行，兼容青龙和 GitHub Actions 的定时任务
+    return COMMANDS[args.command or "run"](args)
+
+
+if __name__ == "__main__":
+    exit(main())